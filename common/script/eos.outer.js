@@ -17,13 +17,13 @@ jQuery(function () {
           document.head.appendChild(link);
       }
       link.href = './icon.png?' + Date.now();
-      return fetch('./config.ini?' + Date.now()).then(x => x.text()).then(y => {
+      return fetch('./config.ini', { cache: 'no-cache' }).then(x => x.text()).then(y => {
         var config = parseINIString(y)
         title = config.title
         author = config.author
         document.title = title
         preview = preview || config.preview === 'true'
-        return fetch('eosscript.json?_dt='+Date.now()+'&id=' + teaseId + (preview ? '&preview=1' : '') + (key ? '&key=' + key : ''), { credentials: 'same-origin' }).then(function (res) { return res.json() }).then(function (json) {
+        return fetch('eosscript.json?id=' + teaseId + (preview ? '&preview=1' : '') + (key ? '&key=' + key : ''), { credentials: 'same-origin', cache: 'no-cache' }).then(function (res) { return res.json() }).then(function (json) {
           script = json
           return { title: title, author: author, script: script, preview: preview }
         })
@@ -1,50 +1,54 @@
 from __future__ import annotations
 
+import collections
+import concurrent.futures
 import configparser
 import functools
 import json
 import logging
-import multiprocessing.dummy as threadiprocessing
+import multiprocessing
 import os
 import platform
 import pyperclip
 import requests
-import shutil
 import subprocess
 import threading
+import typing
 import urllib.parse
 import uuid
 import webbrowser
 
 from bs4 import BeautifulSoup
 from http import HTTPStatus
-from http.server import HTTPServer
 from PyQt6 import QtCore, QtGui, QtWidgets
 
 import english as lang
+import fullTextIndex
+import library
 
 from cards import *
 from constants import *
-from eosHttpServer import MiloHTTPRequestHandler
+from downloader import Downloader
+from eosHttpServer import MiloHTTPRequestHandler, MiloHTTPServer
+from eosscriptCache import EosscriptCache
+from htmlParser import parsePage
+from mediaStore import MediaStore
+from searchIndex import SearchIndex
 from stoppableThread import StoppableThread
+from teaseImport import TeaseImporter
+from teaseList import TeaseCardDelegate, TeaseFilterModel, TeaseListModel
+from trash import Trash
+from thumbnailCache import ThumbnailCache
             
-def copyAll(src, dest, *files) -> list[str]:
-    failedFiles = list()
-    for file in files:
-        try:
-            if os.path.isdir(os.path.join(src, file)):
-                shutil.copytree(os.path.join(src, file), os.path.join(dest, file))
-            else:
-                shutil.copyfile(os.path.join(src, file), os.path.join(dest, file))
-        except Exception as e:
-            logging.error(e)
-            failedFiles.append(file)
-    return failedFiles
-
 def getNewRootDir() -> os.PathLike:
     return os.path.join(TEASES_DIR, str(uuid.uuid4()))
 
 class AppWindow(QtWidgets.QMainWindow):
+    # rootDir, metadata from library.scanTease or the exception it raised
+    teaseScanned = QtCore.pyqtSignal(str, object)
+    # rootDir, document from fullTextIndex.indexTeaseText, None if it was current, or an exception
+    teaseTextIndexed = QtCore.pyqtSignal(str, object)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle(lang.windowTitle % VERSION)
@@ -56,10 +60,36 @@ class AppWindow(QtWidgets.QMainWindow):
         self.config.read("config.ini")
         if "icon_path" not in self.config["General"]:
             self.config["General"]["icon_path"] = "icons/icon.png"
+        if "http_workers" not in self.config["General"]:
+            self.config["General"]["http_workers"] = str(HTTP_WORKERS)
+        if "immutable_paths" not in self.config["General"]:
+            self.config["General"]["immutable_paths"] = "\n".join(IMMUTABLE_PATHS)
+        if "eosscript_cache_mb" not in self.config["General"]:
+            self.config["General"]["eosscript_cache_mb"] = str(EOSSCRIPT_CACHE_MB)
+        if "download_connections" not in self.config["General"]:
+            self.config["General"]["download_connections"] = str(DOWNLOAD_CONNECTIONS)
+        if "shared_media" not in self.config["General"]:
+            self.config["General"]["shared_media"] = "true"
         
+        self.httpd = None
+        self.scanPool: concurrent.futures.ProcessPoolExecutor | None = None
+        self.scanPending = 0
+        self.teaseScanned.connect(self.onTeaseScanned)
+        self.textPending = 0
+        self.teaseTextIndexed.connect(self.onTeaseTextIndexed)
+        self.thumbnailCache = ThumbnailCache(THUMBNAIL_CACHE_DIR, self)
+        self.eosscriptCache = EosscriptCache(self.config["General"].getint("eosscript_cache_mb") * 2**20)
+        self.downloader = Downloader(self.config["General"].getint("download_connections"), DOWNLOAD_RATE)
+        # Media that several teases use is only stored and downloaded once.
+        self.mediaStore = MediaStore(MEDIA_STORE_DIR) if self.config["General"].getboolean("shared_media") else None
+        self.trash = Trash(TRASH_DIR, self.mediaStore)
+        self.downloadQueue = DownloadQueue(self, DOWNLOAD_QUEUE_PATH)
+        self.downloadQueue.load()
+        self.teaseImporter = TeaseImporter(self.mediaStore, self)
+        self.teaseImporter.teaseImported.connect(self.onTeaseImported)
         self.globalSettingsPopup = GlobalSettingsPopup(self)
         self.downloadTeasePopup = DownloadTeasePopup(self)
-        self.httpd = None
+        self.thumbnailCache.thumbnailReady.connect(self.onThumbnailReady)
         self.refreshIcon()
 
         layout = QtWidgets.QHBoxLayout()
@@ -81,29 +111,66 @@ class AppWindow(QtWidgets.QMainWindow):
 
         cardsSubLayout.addLayout(searchSubLayout)
 
-        self.teaseListSubLayout = QtWidgets.QVBoxLayout()
-
+        # Only the visible rows get painted, so this scales to large libraries.
+        self.teaseListModel = TeaseListModel(self)
+        self.teaseFilterModel = TeaseFilterModel(self)
+        self.teaseFilterModel.setSourceModel(self.teaseListModel)
+        self.teaseListView = QtWidgets.QListView(self)
+        self.teaseListView.setModel(self.teaseFilterModel)
+        self.teaseListView.setItemDelegate(TeaseCardDelegate(self.teaseListView))
+        self.teaseListView.setUniformItemSizes(True)
+        self.teaseListView.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.teaseListView.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
+        self.teaseListView.selectionModel().selectionChanged.connect(self.onTeaseSelectionChanged)
+        self.settingsPopups: dict[type[TeaseSettingsPopup], TeaseSettingsPopup] = dict()
+
+        self.fullTextIndex = fullTextIndex.FullTextIndex(FULL_TEXT_INDEX_PATH)
+        self.searchIndex = SearchIndex(self.fullTextIndex)
+        self.searchQuery = ""
+        # Waits for a pause in typing before searching
+        self.searchTimer = QtCore.QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.searchTimer.timeout.connect(self.applySearch)
+
+        self.libraryProgress = QtWidgets.QProgressBar(self)
+        self.libraryProgress.setFormat(f"{lang.loadingLibrary} %v/%m")
+        self.libraryProgress.setMaximum(0)
+        self.libraryProgress.hide()
+        self.statusBar().addPermanentWidget(self.libraryProgress)
+
+        self.importProgress = QtWidgets.QProgressBar(self)
+        self.importProgress.setFormat(f"{lang.importingTeases} %v/%m")
+        self.importProgress.hide()
+        self.statusBar().addPermanentWidget(self.importProgress)
+        self.teaseImporter.progress.connect(self.onImportProgress)
+
+        self.libraryIndex = library.LibraryIndex(LIBRARY_INDEX_PATH)
         if os.path.exists(TEASES_DIR):
-            for folder in os.listdir(TEASES_DIR):
-                rootDir = os.path.join(TEASES_DIR, folder)
-                # Only true if rootDir is also a directory.
-                if not os.path.isfile(os.path.join(rootDir, "config.ini")):
-                    continue
-                self.loadTease(rootDir)
+            self.libraryIndex.load()
+            self.fullTextIndex.load()
+            # Unfinished downloads are loaded once they're done.
+            downloading = self.downloadQueue.getRootDirs()
+            teases = [tease for tease in library.listTeases(TEASES_DIR) if tease[0] not in downloading]
+            self.libraryIndex.prune(rootDir for rootDir, _ in teases)
+            self.fullTextIndex.prune(rootDir for rootDir, _ in teases)
+            toScan = list()
+            for rootDir, signature in teases:
+                if (metadata := self.libraryIndex.lookup(rootDir, signature)) is not None:
+                    self.loadTease(rootDir, metadata)
+                else:
+                    toScan.append(rootDir)
+            logging.info(f"Loaded {len(teases) - len(toScan)} teases from the library index, scanning {len(toScan)}")
+            self.scanLibrary(toScan)
+            if not toScan:
+                self.pruneThumbnails()
+            self.indexLibraryText([rootDir for rootDir, _ in teases])
+            # From deletions that didn't finish before the last exit
+            self.trash.empty()
         else:
             os.makedirs(TEASES_DIR)
 
-        # Need to specify a stretch factor or else it'll try to 
-        # "share" with all the other widgets' stretch spaces.
-        self.teaseListSubLayout.addStretch(1)
-
-        teaseListWidget = QtWidgets.QWidget(self)
-        teaseListWidget.setLayout(self.teaseListSubLayout)
-
-        teaseScroll = QtWidgets.QScrollArea(self)
-        teaseScroll.setWidget(teaseListWidget)
-        teaseScroll.setWidgetResizable(True)  # Allows cards to expand horizontally
-        cardsSubLayout.addWidget(teaseScroll)
+        cardsSubLayout.addWidget(self.teaseListView)
 
         layout.addLayout(cardsSubLayout)
 
@@ -129,6 +196,10 @@ class AppWindow(QtWidgets.QMainWindow):
         openTeaseFolderButton.pressed.connect(self.openTeaseFolder)
         buttonsSubLayout.addWidget(openTeaseFolderButton)
 
+        updateTeaseButton = QtWidgets.QPushButton(lang.updateTease, self)
+        updateTeaseButton.pressed.connect(self.updateTease)
+        buttonsSubLayout.addWidget(updateTeaseButton)
+
         buttonsSubLayout.addStretch()
 
         importEOSTeaseButton = QtWidgets.QPushButton(lang.importTease, self)
@@ -152,46 +223,206 @@ class AppWindow(QtWidgets.QMainWindow):
 
         self.setCentralWidget(mainWidget)
 
-    def loadTease(self, rootDir) -> TeaseCard | None:
+        self.downloadQueue.schedule()
+
+    def loadTease(self, rootDir, metadata: dict | None = None) -> TeaseCard | None:
         try:
-            if os.path.isfile(os.path.join(rootDir, "eosscript.json")):
-                teaseCard = EosTeaseCard(self, rootDir)
-            else:
-                teaseCard = RegularTeaseCard(self, rootDir)
-            self.teases[rootDir] = teaseCard
-            # Places the card before the stretch.
-            self.teaseListSubLayout.insertWidget(len(self.teaseListSubLayout) - 1, teaseCard)
-            return teaseCard
+            if metadata is None:
+                metadata = library.scanTease(rootDir)
+                self.libraryIndex.update(metadata)
+                self.indexLibraryText([rootDir])
+            return self.addTeaseCard(rootDir, metadata)
         except Exception as e:
             logging.error(e)
             return None
     
+    # Picks up files that were rewritten on disk, e.g. by an update.
+    def reloadTease(self, tease: TeaseCard):
+        try:
+            metadata = library.scanTease(tease.rootDir)
+            tease.applyMetadata(metadata)
+            self.libraryIndex.update(metadata)
+            self.indexTease(tease)
+            self.indexLibraryText([tease.rootDir])
+        except Exception as e:
+            logging.error(e)
+    
+    # Creates a placeholder card if metadata is None.
+    def addTeaseCard(self, rootDir, metadata: dict | None = None) -> TeaseCard:
+        if (metadata["kind"] if metadata is not None else library.getTeaseKind(rootDir)) == "eos":
+            teaseCard = EosTeaseCard(self, rootDir, metadata)
+        else:
+            teaseCard = RegularTeaseCard(self, rootDir, metadata)
+        self.teases[rootDir] = teaseCard
+        self.teaseListModel.addTease(teaseCard)
+        if teaseCard.loaded:
+            self.indexTease(teaseCard)
+        return teaseCard
+    
+    def scanLibrary(self, rootDirs: list[str]):
+        """Shows placeholder cards for rootDirs and fills them in as worker processes scan them."""
+        if not rootDirs:
+            return
+        for rootDir in rootDirs:
+            self.addTeaseCard(rootDir)
+        scanPool = self.getScanPool()
+        self.scanPending += len(rootDirs)
+        self.libraryProgress.setMaximum(self.libraryProgress.maximum() + len(rootDirs))
+        self.libraryProgress.show()
+        for rootDir in rootDirs:
+            scanPool.submit(library.scanTease, rootDir).add_done_callback(
+                functools.partial(self._emitTeaseScanned, rootDir))
+    
+    def getScanPool(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self.scanPool is None:
+            # Forking a process that already runs Qt and server threads isn't safe.
+            self.scanPool = concurrent.futures.ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+        return self.scanPool
+    
+    # Runs in the pool's management thread, the signal hands it to the GUI thread.
+    def _emitTeaseScanned(self, rootDir, future: concurrent.futures.Future):
+        if future.cancelled():
+            return
+        self.teaseScanned.emit(rootDir, future.exception() or future.result())
+    
+    def onTeaseScanned(self, rootDir: str, metadata: dict | Exception):
+        self.scanPending -= 1
+        self.libraryProgress.setValue(self.libraryProgress.maximum() - self.scanPending)
+        if self.scanPending == 0:
+            self.libraryProgress.hide()
+            self.libraryProgress.setMaximum(0)
+            self.libraryIndex.save()
+            self.pruneThumbnails()
+        if (teaseCard := self.teases.get(rootDir)) is None or teaseCard.loaded:
+            return
+        if isinstance(metadata, Exception):
+            logging.error(f"Loading {rootDir} failed: {metadata}")
+            self.unloadTease(teaseCard)
+            return
+        try:
+            teaseCard.applyMetadata(metadata)
+            self.libraryIndex.update(metadata)
+            self.indexTease(teaseCard)
+        except Exception as e:
+            logging.error(e)
+            self.unloadTease(teaseCard)
+    
+    def indexLibraryText(self, rootDirs: list[str]):
+        """Brings the full-text index up to date for rootDirs in worker processes."""
+        if not rootDirs:
+            return
+        scanPool = self.getScanPool()
+        self.textPending += len(rootDirs)
+        for rootDir in rootDirs:
+            scanPool.submit(fullTextIndex.indexTeaseText, rootDir, self.fullTextIndex.getSignature(rootDir)) \
+                .add_done_callback(functools.partial(self._emitTeaseTextIndexed, rootDir))
+    
+    def _emitTeaseTextIndexed(self, rootDir, future: concurrent.futures.Future):
+        if future.cancelled():
+            return
+        self.teaseTextIndexed.emit(rootDir, future.exception() or future.result())
+    
+    def onTeaseTextIndexed(self, rootDir: str, document: dict | Exception | None):
+        self.textPending -= 1
+        if isinstance(document, Exception):
+            logging.warning(f"Indexing the text of {rootDir} failed: {document}")
+        elif document is not None and rootDir in self.teases:
+            self.fullTextIndex.update(document)
+            if self.searchQuery and not self.searchTimer.isActive():
+                self.searchTimer.start()
+        if self.textPending == 0:
+            logging.info(f"Full-text index covers {len(self.fullTextIndex)} teases")
+            self.fullTextIndex.save()
+    
+    def onThumbnailReady(self, rootDir: str, thumbnail: QtGui.QImage):
+        if (teaseCard := self.teases.get(rootDir)) is not None:
+            teaseCard.setThumbnail(thumbnail)
+    
+    def pruneThumbnails(self):
+        self.thumbnailCache.prune(tease.metadata["thumbnail"] for tease in self.teases.values()
+                                  if tease.loaded and tease.metadata["thumbnail"] is not None)
+    
+    def cancelLibraryScan(self):
+        if self.scanPool is not None:
+            self.scanPool.shutdown(wait=False, cancel_futures=True)
+            self.scanPool = None
+    
+    def closeEvent(self, event):
+        self.cancelLibraryScan()
+        self.teaseImporter.shutdown()
+        self.trash.shutdown()
+        self.thumbnailCache.shutdown()
+        self.downloadQueue.shutdown()
+        self.downloader.close()
+        self.libraryIndex.save()
+        self.fullTextIndex.save()
+        logging.info(f"Eosscript cache: {self.eosscriptCache.getUsage()}")
+        return super().closeEvent(event)
+    
+    # Called by tease cards after they rewrite their files.
+    def teaseChanged(self, tease: TeaseCard):
+        if tease.loaded:
+            self.libraryIndex.update(tease.metadata)
+            self.indexTease(tease)
+    
+    def indexTease(self, tease: TeaseCard):
+        self.searchIndex.add(tease.rootDir, tease.config["General"])
+        if self.searchQuery:
+            self.searchTimer.start()
+    
     def unloadTease(self, tease: TeaseCard):
         del self.teases[tease.rootDir]
-        self.teaseListSubLayout.removeWidget(tease)
-        tease.close()
+        self.libraryIndex.remove(tease.rootDir)
+        self.searchIndex.remove(tease.rootDir)
+        self.fullTextIndex.remove(tease.rootDir)
+        self.eosscriptCache.discard(tease.rootDir)
+        if self.httpd is not None:
+            self.httpd.compressionCache.discard(tease.rootDir)
+        if tease.loaded and tease.metadata["thumbnail"] is not None:
+            self.thumbnailCache.evict(tease.metadata["thumbnail"])
+        self.teaseListModel.removeTease(tease)
     
     def setSelectedTease(self, tease: TeaseCard):
+        if not tease.loaded:
+            return
+        # Updates selectedTease through onTeaseSelectionChanged
+        self.teaseListView.setCurrentIndex(
+            self.teaseFilterModel.mapFromSource(self.teaseListModel.indexOf(tease)))
+    
+    def onTeaseSelectionChanged(self):
+        indexes = self.teaseListView.selectionModel().selectedIndexes()
+        self.selectedTease = indexes[0].data(TeaseListModel.TeaseRole) if indexes else None
         if self.selectedTease is not None:
-            self.selectedTease.setAutoFillBackground(False)
-        self.selectedTease = tease
-        self.selectedTease.setAutoFillBackground(True)
-        logging.debug(f"Set selected tease to {tease} with rootDir {tease.rootDir}")
+            logging.debug(f"Set selected tease to {self.selectedTease} with rootDir {self.selectedTease.rootDir}")
     
+    # See SearchIndex for the query syntax.
     def filterTeases(self, text: str):
-        for tease in self.teases.values():
-            tease.setVisible(text.lower() in tease.config["General"]["title"].lower() or \
-                             text.lower() in tease.config["General"]["author"].lower())
+        self.searchQuery = text
+        self.searchTimer.start()
+    
+    def applySearch(self):
+        if (matches := self.searchIndex.search(self.searchQuery)) is None:
+            self.teaseFilterModel.setPredicate(None)
+        else:
+            self.teaseFilterModel.setPredicate(lambda tease: tease.rootDir in matches,
+                                               self.searchIndex.rank(self.searchQuery, matches))
 
     def saveSettings(self):
         with open("config.ini", "w") as inifile:
             self.config.write(inifile)
-        if (self.config["General"]["ip"], int(self.config["General"]["port"])) != self.httpd.server_address:
+        if (self.config["General"]["ip"], int(self.config["General"]["port"])) != self.httpd.server_address or \
+              self.config["General"].getint("http_workers") != self.httpd.workers:
             logging.debug("Restarting HTTP server")
             self.stopHttpServer()
             self.startHttpServer()
         else:
-            logging.debug("Skipping restarting HTTP server as server address did not change.")
+            logging.debug("Skipping restarting HTTP server as server address and workers did not change.")
+        if self.config["General"].getint("download_connections") != self.downloader.connectionsPerHost:
+            # Running downloads keep using the old one until they're done, within the same per-host limits.
+            oldDownloader = self.downloader
+            self.downloader = Downloader(self.config["General"].getint("download_connections"), DOWNLOAD_RATE,
+                                         oldDownloader)
+            oldDownloader.close(cancel=False)
         self.refreshIcon()
     
     def refreshIcon(self):
@@ -200,11 +431,16 @@ class AppWindow(QtWidgets.QMainWindow):
     def startHttpServer(self):
         if self.httpd is not None:
             logging.warn("Trying to start two HTTP servers at once!")
-        self.httpd = HTTPServer((self.config["General"]["ip"], int(self.config["General"]["port"])), 
-                                functools.partial(MiloHTTPRequestHandler, directory=TEASES_DIR, 
-                                                  commonDir=COMMON_DIR, appWindow=self))
+        self.httpd = MiloHTTPServer((self.config["General"]["ip"], int(self.config["General"]["port"])), 
+                                    functools.partial(MiloHTTPRequestHandler, directory=TEASES_DIR, 
+                                                      commonDir=COMMON_DIR, appWindow=self),
+                                    workers=self.config["General"].getint("http_workers"),
+                                    immutablePaths=self.config["General"]["immutable_paths"].splitlines())
         threading.Thread(target = self.httpd.serve_forever).start()
-        logging.info(f"Serving files on http://{self.config['General']['ip']}:{self.config['General']['port']}")
+        # Compress the React chunks ahead of the first page load.
+        threading.Thread(target = self.httpd.compressionCache.precompress, daemon=True,
+                         args=(os.path.join(COMMON_DIR, "static"), MiloHTTPRequestHandler.fileETag)).start()
+        logging.info(f"Serving files on http://{self.config['General']['ip']}:{self.config['General']['port']} with {self.httpd.workers} workers")
 
     def stopHttpServer(self):
         # Waits for thread to complete, in theory.
@@ -219,8 +455,15 @@ class AppWindow(QtWidgets.QMainWindow):
     
     def showTeaseSettingsPopup(self):
         if self.selectedTease is not None:
-            self.selectedTease.settingsPopup.refreshSettings()
-            self.selectedTease.settingsPopup.show()
+            settingsPopup = self.getSettingsPopup(self.selectedTease.getSettingsPopupType())
+            settingsPopup.setTease(self.selectedTease)
+            settingsPopup.refreshSettings()
+            settingsPopup.show()
+    
+    def getSettingsPopup(self, popupType: type[TeaseSettingsPopup]) -> TeaseSettingsPopup:
+        if (settingsPopup := self.settingsPopups.get(popupType)) is None:
+            settingsPopup = self.settingsPopups[popupType] = popupType(self)
+        return settingsPopup
     
     def openTeaseInBrowser(self):
         if self.selectedTease is not None:
@@ -249,10 +492,24 @@ class AppWindow(QtWidgets.QMainWindow):
             logging.debug("Canceled when importing tease from EOS at file picker.")
             return
         
-        newRootDir = getNewRootDir()
-        os.mkdir(newRootDir)
-        copyAll(rootDir, newRootDir, "tease", "timg", "config.ini", "eosscript.json")
-        logging.info(f"Copied tease files from {rootDir} to {newRootDir}")
+        # A folder of teases imports every one of them.
+        sourceDirs = [rootDir]
+        if not os.path.isfile(os.path.join(rootDir, "eosscript.json")):
+            with os.scandir(rootDir) as entries:
+                sourceDirs = sorted(entry.path for entry in entries if entry.is_dir() and
+                                    os.path.isfile(os.path.join(entry.path, "eosscript.json"))) or sourceDirs
+        logging.info(f"Importing {len(sourceDirs)} teases from {rootDir}")
+        self.teaseImporter.start([(sourceDir, getNewRootDir()) for sourceDir in sourceDirs])
+    
+    def onImportProgress(self, done: int, total: int):
+        self.importProgress.setMaximum(total)
+        self.importProgress.setValue(done)
+        self.importProgress.setVisible(total > 0)
+    
+    def onTeaseImported(self, rootDir: str, newRootDir: str, imported: bool):
+        if not imported:
+            logging.error(f"Importing tease from {rootDir} failed!")
+            return
         teaseCard = self.loadTease(newRootDir)
         if teaseCard is not None:
             if (teaseId := os.path.basename(rootDir)).isdigit():
@@ -262,6 +519,15 @@ class AppWindow(QtWidgets.QMainWindow):
         else:
             logging.error(f"Loading imported tease with {newRootDir=} failed!")
     
+    def updateTease(self):
+        if self.selectedTease is None:
+            return
+        if not self.selectedTease.config["General"]["tease_id"].isdigit():
+            logging.warning(f"Can't update {self.selectedTease.rootDir} without a tease ID")
+            return
+        self.downloadQueue.addUpdate(self.selectedTease)
+        self.showDownloadPopup()
+    
     def showDownloadPopup(self):
         self.downloadTeasePopup.refreshSettings()
         self.downloadTeasePopup.show()
@@ -269,7 +535,12 @@ class AppWindow(QtWidgets.QMainWindow):
     def deleteTease(self):
         if self.selectedTease is not None:
             logging.debug(f"Deleting {self.selectedTease.rootDir}")
-            shutil.rmtree(self.selectedTease.rootDir)
+            try:
+                self.trash.move(self.selectedTease.rootDir)
+            except OSError as e:
+                logging.error(f"Could not delete {self.selectedTease.rootDir}: {e}")
+                return
+            self.downloadQueue.removeTease(self.selectedTease.rootDir)
             self.unloadTease(self.selectedTease)
             self.selectedTease = None
     
@@ -299,26 +570,46 @@ class GlobalSettingsPopup(QtWidgets.QDialog):
         self.portTextBox = QtWidgets.QLineEdit(self)
         layout.addWidget(self.portTextBox, 1, 1)
 
+        workersTextBoxHint = QtWidgets.QLabel(self)
+        workersTextBoxHint.setText(lang.workersTextBoxHint)
+        layout.addWidget(workersTextBoxHint, 2, 0)
+
+        self.workersTextBox = QtWidgets.QLineEdit(self)
+        self.workersTextBox.setValidator(QtGui.QIntValidator(1, 256, self))
+        layout.addWidget(self.workersTextBox, 2, 1)
+
+        connectionsTextBoxHint = QtWidgets.QLabel(self)
+        connectionsTextBoxHint.setText(lang.connectionsTextBoxHint)
+        layout.addWidget(connectionsTextBoxHint, 3, 0)
+
+        self.connectionsTextBox = QtWidgets.QLineEdit(self)
+        self.connectionsTextBox.setValidator(QtGui.QIntValidator(1, 64, self))
+        layout.addWidget(self.connectionsTextBox, 3, 1)
+
         changeIconButton = QtWidgets.QPushButton(lang.changeIcon, self)
         changeIconButton.pressed.connect(self.changeIcon)
-        layout.addWidget(changeIconButton, 2, 0)
+        layout.addWidget(changeIconButton, 4, 0)
         
         self.currentIconPath = QtWidgets.QLabel(self)
-        layout.addWidget(self.currentIconPath, 2, 1)
+        layout.addWidget(self.currentIconPath, 4, 1)
         
         saveButton = QtWidgets.QPushButton(self)
         saveButton.setText(lang.saveSettings)
         saveButton.clicked.connect(self.saveSettings)
-        layout.addWidget(saveButton, 3, 0, 1, 2)
+        layout.addWidget(saveButton, 5, 0, 1, 2)
     
     def refreshSettings(self):
         self.ipTextBox.setText(self.creator.config["General"]["ip"])
         self.portTextBox.setText(self.creator.config["General"]["port"])
+        self.workersTextBox.setText(self.creator.config["General"]["http_workers"])
+        self.connectionsTextBox.setText(self.creator.config["General"]["download_connections"])
         self.setIconPath(self.creator.config["General"]["icon_path"])
     
     def saveSettings(self):
         self.creator.config["General"]["ip"] = self.ipTextBox.text()
         self.creator.config["General"]["port"] = self.portTextBox.text()
+        self.creator.config["General"]["http_workers"] = self.workersTextBox.text() or str(HTTP_WORKERS)
+        self.creator.config["General"]["download_connections"] = self.connectionsTextBox.text() or str(DOWNLOAD_CONNECTIONS)
         self.creator.config["General"]["icon_path"] = self.iconPath
         self.creator.saveSettings()
         self.hide()
@@ -334,15 +625,229 @@ class GlobalSettingsPopup(QtWidgets.QDialog):
         # Again, sorry not sorry
         self.currentIconPath.setText(f"{self.iconPath[:16]}...{self.iconPath[len(self.iconPath)-21:]}" if len(self.iconPath) > 40 else self.iconPath)
 
+class DownloadQueue(QtCore.QObject):
+    """Teases waiting to be downloaded, saved to disk so they survive restarts.
+
+    Up to DOWNLOAD_TEASES jobs run at once, highest priority first. They
+    share the connections of creator.downloader, so the per-host limit
+    applies to all of them together. Finished teases are loaded right away.
+    """
+    # DownloadJob
+    jobChanged = QtCore.pyqtSignal(object)
+    # DownloadJob, whether it downloaded everything
+    jobFinished = QtCore.pyqtSignal(object, bool)
+    # Every ID range is capped so a typo can't queue half the site.
+    MAX_BATCH = 1000
+
+    def __init__(self, creator: AppWindow, path: os.PathLike):
+        super().__init__(creator)
+        self.creator = creator
+        self.path = path
+        self.jobs: list[DownloadJob] = list()
+        self.paused = False
+        self.nextSeq = 0
+        self.jobFinished.connect(self.onJobFinished)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                for job in json.load(f)["jobs"]:
+                    self.jobs.append(DownloadJob(self, job["teaseId"], job["priority"], job["seq"],
+                                                 job["rootDir"], job["state"], job.get("update", False),
+                                                 [tuple(media) for media in job.get("failedMedia", [])]))
+            self.nextSeq = max((job.seq for job in self.jobs), default=-1) + 1
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Could not read download queue {self.path}: {e}")
+
+    def save(self):
+        tmpPath = f"{self.path}.tmp"
+        try:
+            with open(tmpPath, "w") as f:
+                json.dump({"jobs": [job.toJson() for job in self.jobs if job.state != DownloadJob.DONE]}, f)
+            os.replace(tmpPath, self.path)
+        except OSError as e:
+            logging.warning(f"Could not write download queue {self.path}: {e}")
+
+    @classmethod
+    def parseTeaseIds(cls, text: str) -> list[str]:
+        """Reads IDs like "123, 456 1000-1005"."""
+        teaseIds = list()
+        for part in text.replace(",", " ").split():
+            first, _, last = part.partition("-")
+            if not first.isdigit() or last and not last.isdigit():
+                raise ValueError(f"Invalid tease ID {part}")
+            if not last:
+                teaseIds.append(str(int(first)))
+            elif not 0 <= int(last) - int(first) < cls.MAX_BATCH:
+                raise ValueError(f"Invalid tease ID range {part}")
+            else:
+                teaseIds.extend(str(teaseId) for teaseId in range(int(first), int(last) + 1))
+        return teaseIds
+
+    def add(self, teaseIds: list[str], priority: int = 0):
+        queued = {job.teaseId for job in self.jobs if job.state != DownloadJob.DONE}
+        for teaseId in teaseIds:
+            if teaseId in queued:
+                logging.info(f"Tease {teaseId} is already in the download queue")
+                continue
+            self.jobs.append(DownloadJob(self, teaseId, priority, self.nextSeq))
+            self.nextSeq += 1
+        self.save()
+        self.schedule()
+
+    def addUpdate(self, tease: TeaseCard):
+        """Queues fetching the eosscript of tease again, along with any media it lacks."""
+        if any(job.rootDir == tease.rootDir and job.state != DownloadJob.DONE for job in self.jobs):
+            logging.info(f"{tease.rootDir} is already in the download queue")
+            return
+        self.jobs.append(DownloadJob(self, tease.config["General"]["tease_id"], seq=self.nextSeq,
+                                     rootDir=tease.rootDir, update=True))
+        self.nextSeq += 1
+        self.save()
+        self.schedule()
+
+    def getRootDirs(self) -> set[str]:
+        """Folders of the downloads that haven't finished, which aren't teases yet."""
+        return {job.rootDir for job in self.jobs if job.state != DownloadJob.DONE and not job.update}
+
+    def isRunning(self) -> bool:
+        return any(job.state == DownloadJob.RUNNING for job in self.jobs)
+
+    def schedule(self):
+        running = sum(job.state == DownloadJob.RUNNING for job in self.jobs)
+        if self.paused or running >= DOWNLOAD_TEASES:
+            return
+        queued = sorted((job for job in self.jobs if job.state == DownloadJob.QUEUED),
+                        key=lambda job: (-job.priority, job.seq))
+        for job in queued[:DOWNLOAD_TEASES - running]:
+            logging.info(f"Starting download of tease {job.teaseId}")
+            if job.start():
+                self.jobChanged.emit(job)
+
+    def setPaused(self, paused: bool):
+        """Stops starting new jobs. Running ones are paused as well and resume afterwards."""
+        self.paused = paused
+        for job in self.jobs:
+            if paused and job.state == DownloadJob.RUNNING:
+                # Goes back to QUEUED in onJobFinished
+                job.stop()
+        if not paused:
+            self.schedule()
+
+    def pause(self, job: DownloadJob):
+        if job.state == DownloadJob.RUNNING:
+            # Stays RUNNING until its thread is done with the folder, see onJobFinished.
+            job.stop()
+            job.pausing = True
+            job.status = lang.downloadPausing
+        elif job.state == DownloadJob.QUEUED:
+            job.state = DownloadJob.PAUSED
+            job.status = lang.downloadPaused
+        else:
+            return
+        self.jobChanged.emit(job)
+        self.save()
+
+    def resume(self, job: DownloadJob):
+        if job.state == DownloadJob.RUNNING and job.pausing:
+            # Queued again once its thread has stopped
+            job.pausing = False
+            job.status = lang.downloadQueued
+            self.jobChanged.emit(job)
+            self.save()
+        elif job.state in (DownloadJob.PAUSED, DownloadJob.FAILED):
+            job.state = DownloadJob.QUEUED
+            job.status = lang.downloadQueued
+            self.jobChanged.emit(job)
+            self.save()
+            self.schedule()
+
+    def setPriority(self, job: DownloadJob, priority: int):
+        job.priority = priority
+        self.jobChanged.emit(job)
+        self.save()
+
+    def remove(self, job: DownloadJob):
+        job.removed = True
+        self.jobs.remove(job)
+        if job.state == DownloadJob.RUNNING:
+            # The folder is deleted in onJobFinished once the thread let go of it.
+            job.stop()
+        elif job.state != DownloadJob.DONE:
+            self.deleteRootDir(job)
+        self.jobChanged.emit(job)
+        self.save()
+
+    def removeTease(self, rootDir: os.PathLike):
+        """Removes the jobs of a tease that was deleted, so none of them brings it back."""
+        for job in [job for job in self.jobs if job.rootDir == rootDir]:
+            job.deleted = True
+            job.update = False
+            self.remove(job)
+
+    def clearFinished(self):
+        self.jobs = [job for job in self.jobs if job.state != DownloadJob.DONE]
+        self.jobChanged.emit(None)
+
+    def onJobFinished(self, job: DownloadJob, done: bool):
+        job.running = False
+        pausing, job.pausing = job.pausing, False
+        if job.removed:
+            if not done or job.deleted:
+                self.deleteRootDir(job)
+            elif job.rootDir not in self.creator.teases:
+                self.creator.loadTease(job.rootDir)
+        elif done:
+            logging.info(f"Downloaded tease {job.teaseId} to {job.rootDir}")
+            job.state = DownloadJob.DONE
+            if job.rootDir in self.creator.teases:
+                self.creator.reloadTease(self.creator.teases[job.rootDir])
+            else:
+                self.creator.loadTease(job.rootDir)
+            if job.failedMedia:
+                # The tease is in the library now, so retrying only updates it.
+                job.update = True
+                job.state = DownloadJob.FAILED
+                job.status = lang.downloadMediaFailed % len(job.failedMedia)
+        elif job.state == DownloadJob.RUNNING:
+            if job.stopped() and pausing:
+                job.state = DownloadJob.PAUSED
+                job.status = lang.downloadPaused
+            elif job.stopped():
+                # Stopped by setPaused, shutdown or a pause that was resumed
+                job.state = DownloadJob.QUEUED
+                job.status = lang.downloadQueued
+            else:
+                job.state = DownloadJob.FAILED
+        self.jobChanged.emit(job)
+        self.save()
+        self.schedule()
+
+    def deleteRootDir(self, job: DownloadJob):
+        # Updated teases keep their folder no matter what.
+        if not job.update and os.path.isdir(job.rootDir):
+            logging.debug(f"Deleting unfinished download {job.rootDir}")
+            try:
+                self.creator.trash.move(job.rootDir)
+            except OSError as e:
+                logging.warning(f"Could not delete unfinished download {job.rootDir}: {e}")
+
+    def shutdown(self):
+        self.paused = True
+        for job in self.jobs:
+            job.stop()
+        self.save()
+
 class DownloadTeasePopup(QtWidgets.QDialog):
     def __init__(self, creator: AppWindow):
         super().__init__(creator)
         self.setWindowTitle(f"{lang.windowTitle % VERSION}: {lang.downloadTease}")
         self.setMinimumWidth(4 * WINDOW_SIZE)
-        self.setModal(True)
         self.creator = creator
-        self.downloadThread = None
-        self.toAdd: list[TeaseCard] = list()
+        self.queue = creator.downloadQueue
+        self.queue.jobChanged.connect(self.refreshJobs)
 
         layout = QtWidgets.QVBoxLayout()
         self.setLayout(layout)
@@ -350,14 +855,23 @@ class DownloadTeasePopup(QtWidgets.QDialog):
         idTextBoxSubLayout = QtWidgets.QHBoxLayout()
         
         idTextBoxHint = QtWidgets.QLabel(self)
-        idTextBoxHint.setText(lang.teaseIdTextBoxHint)
+        idTextBoxHint.setText(lang.teaseIdsTextBoxHint)
         idTextBoxSubLayout.addWidget(idTextBoxHint)
 
-        idTextBoxValidator = QtGui.QIntValidator(self)
+        idTextBoxValidator = QtGui.QRegularExpressionValidator(QtCore.QRegularExpression(r"[\d\s,-]*"), self)
 
         self.idTextBox = QtWidgets.QLineEdit(self)
         self.idTextBox.setValidator(idTextBoxValidator)
+        self.idTextBox.returnPressed.connect(self.beginDownload)
         idTextBoxSubLayout.addWidget(self.idTextBox)
+
+        priorityHint = QtWidgets.QLabel(self)
+        priorityHint.setText(lang.downloadPriority)
+        idTextBoxSubLayout.addWidget(priorityHint)
+
+        self.prioritySpinBox = QtWidgets.QSpinBox(self)
+        self.prioritySpinBox.setRange(-99, 99)
+        idTextBoxSubLayout.addWidget(self.prioritySpinBox)
         
         layout.addLayout(idTextBoxSubLayout)
         
@@ -368,144 +882,331 @@ class DownloadTeasePopup(QtWidgets.QDialog):
         
         self.downloadStatus = QtWidgets.QLabel(self)
         layout.addWidget(self.downloadStatus)
+
+        self.jobList = QtWidgets.QListWidget(self)
+        self.jobList.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection)
+        layout.addWidget(self.jobList)
+
+        jobButtonsSubLayout = QtWidgets.QHBoxLayout()
+
+        for text, slot in ((lang.downloadPause, self.pauseSelected),
+                           (lang.downloadResume, self.resumeSelected),
+                           (lang.downloadRaisePriority, self.raiseSelected),
+                           (lang.downloadRemove, self.removeSelected),
+                           (lang.downloadClearFinished, self.queue.clearFinished)):
+            button = QtWidgets.QPushButton(text, self)
+            button.clicked.connect(slot)
+            jobButtonsSubLayout.addWidget(button)
+
+        layout.addLayout(jobButtonsSubLayout)
+
+        self.pauseAllButton = QtWidgets.QCheckBox(lang.downloadPauseAll, self)
+        self.pauseAllButton.toggled.connect(self.queue.setPaused)
+        layout.addWidget(self.pauseAllButton)
     
     def refreshSettings(self):
         self.idTextBox.setText("")
         self.downloadStatus.setText(lang.downloadInfo)
+        self.pauseAllButton.setChecked(self.queue.paused)
+        self.refreshJobs()
     
-    def beginDownload(self):
-        # TODO make the download button into a progress bar?
-        if self.downloadThread is None:
-            self.idTextBox.setEnabled(False)
-            self.downloadButton.setEnabled(False)
-            self.downloadThread = StoppableThread(target=self.downloadTease)
-            self.downloadThread.start()
+    def refreshJobs(self, job: DownloadJob | None = None):
+        if job is not None and job in self.queue.jobs:
+            # Running jobs report every second, so only their own item is redrawn.
+            for row in range(self.jobList.count()):
+                if (item := self.jobList.item(row)).data(QtCore.Qt.ItemDataRole.UserRole) is job:
+                    item.setText(lang.downloadJob % (job.teaseId, job.priority, job.status))
+                    return
+        selected = {id(job) for job in self.getSelectedJobs()}
+        self.jobList.clear()
+        for job in self.queue.jobs:
+            item = QtWidgets.QListWidgetItem(lang.downloadJob % (job.teaseId, job.priority, job.status))
+            item.setData(QtCore.Qt.ItemDataRole.UserRole, job)
+            self.jobList.addItem(item)
+            item.setSelected(id(job) in selected)
     
-    def closeEvent(self, event):
-        if self.downloadThread is not None:
-            self.downloadThread.stop()
-        for rootDir in self.toAdd:
-            self.creator.loadTease(rootDir)
-        self.toAdd.clear()
-        return super().closeEvent(event)
+    def getSelectedJobs(self) -> list[DownloadJob]:
+        return [item.data(QtCore.Qt.ItemDataRole.UserRole) for item in self.jobList.selectedItems()]
     
-    def downloadTease(self):
+    def beginDownload(self):
         try:
-            rootDir = getNewRootDir()
-            logging.debug(f"Creating folder {rootDir} for downloading tease id {self.idTextBox.text()}.")
-            os.makedirs(os.path.join(rootDir, "timg", "tb_xl"))
-
-            if self.downloadThread.stopped():
-                logging.debug("Download Thread Stopping!")
-                return
-            
-            logging.debug(f"Downloading metadata for {self.idTextBox.text()}.")
-            self.downloadStatus.setText(lang.downloadingMeta)
-            metaReq = requests.get(f"https://milovana.com/webteases/showtease.php?id={self.idTextBox.text()}")
-            if metaReq.status_code != HTTPStatus.OK:
-                self.downloadStatus.setText(lang.downloadUnknownError)
-                logging.error(f"Error downloading metadata: {metaReq.status_code=}, {metaReq.reason=}")
-                return
-            
-            if self.downloadThread.stopped():
-                logging.debug("Download Thread Stopping!")
-                return
-            
-            metaHtmlTree = BeautifulSoup(metaReq.content.decode(), "html.parser")
-
-            # Can't use status codes since the site always seems to return 200 if it's not down.
-            if (titleElem := metaHtmlTree.find("head").find("title").string) is not None:
-                if titleElem == "Milovana.com - This tease is invisible.":
-                    self.downloadStatus.setText(lang.downloadInvisibleTease)
-                    logging.error(f"Tease ID {self.idTextBox.text()} is invisible.")
-                    return
-                elif titleElem == "Milovana.com - Tease not found.":
-                    self.downloadStatus.setText(lang.downloadInvalidId)
-                    logging.error(f"Tease ID {self.idTextBox.text()} is invalid.")
-                    return
+            teaseIds = self.queue.parseTeaseIds(self.idTextBox.text())
+        except ValueError as e:
+            logging.warning(e)
+            self.downloadStatus.setText(lang.downloadInvalidId)
+            return
+        if teaseIds:
+            self.queue.add(teaseIds, self.prioritySpinBox.value())
+            self.idTextBox.setText("")
+            self.downloadStatus.setText(lang.downloadAdded % len(teaseIds))
+    
+    def pauseSelected(self):
+        for job in self.getSelectedJobs():
+            self.queue.pause(job)
+    
+    def resumeSelected(self):
+        for job in self.getSelectedJobs():
+            self.queue.resume(job)
+    
+    def raiseSelected(self):
+        for job in self.getSelectedJobs():
+            self.queue.setPriority(job, job.priority + 1)
+    
+    def removeSelected(self):
+        for job in self.getSelectedJobs():
+            self.queue.remove(job)
+
+class DownloadJob:
+    """One tease in the download queue. It downloads on its own StoppableThread."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    PAUSED = "paused"
+    DONE = "done"
+    FAILED = "failed"
+    # What downloadMedia did with a file
+    MEDIA_PRESENT = "present"
+    MEDIA_DOWNLOADED = "downloaded"
+    MEDIA_FAILED = "failed"
+
+    # With update, rootDir is an existing tease that is brought up to date.
+    # When failedMedia is given, only those (file, url) are downloaded again.
+    def __init__(self, queue: DownloadQueue, teaseId: str, priority: int = 0, seq: int = 0,
+                 rootDir: os.PathLike | None = None, state: str = QUEUED, update: bool = False,
+                 failedMedia: list[tuple[str, str]] | None = None):
+        self.queue = queue
+        self.teaseId = teaseId
+        self.priority = priority
+        # Order the job was added in, which breaks ties between priorities
+        self.seq = seq
+        # Kept across restarts so media that was already downloaded is reused
+        self.rootDir = rootDir if rootDir is not None else getNewRootDir()
+        self.state = state
+        self.update = update
+        self.failedMedia = failedMedia if failedMedia is not None else list()
+        if state == self.FAILED:
+            # Why it failed isn't saved, only what is left to retry.
+            self.status = lang.downloadMediaFailed % len(self.failedMedia) if self.failedMedia else lang.downloadFailed
+        else:
+            self.status = {self.QUEUED: lang.downloadQueued, self.PAUSED: lang.downloadPaused}.get(state, "")
+        self.removed = False
+        # Removed because its tease was deleted, whatever it wrote is deleted too
+        self.deleted = False
+        # Stopped by pause, becomes PAUSED once its thread finished
+        self.pausing = False
+        # From start until the thread's jobFinished was handled
+        self.running = False
+        self.thread: StoppableThread | None = None
+        self.downloader: Downloader | None = None
+        # (file, url) -> future of downloadMedia
+        self.mediaFutures: dict[tuple[str, str], concurrent.futures.Future] = dict()
+
+    def toJson(self) -> dict:
+        return {
+            "teaseId": self.teaseId,
+            "priority": self.priority,
+            "seq": self.seq,
+            "rootDir": self.rootDir,
+            # Interrupted downloads continue on the next start.
+            "state": (self.PAUSED if self.pausing else self.QUEUED) if self.state == self.RUNNING else self.state,
+            "update": self.update,
+            "failedMedia": self.failedMedia
+        }
 
-            if (eosTopBody := metaHtmlTree.find("body", {"class": "eosTopBody"})) is not None:
-                if self.idTextBox.text() != eosTopBody.attrs["data-tease-id"]:
-                    raise ValueError("Metadata ID does not match entered ID")
-                medias = self.downloadEosTease(rootDir, self.idTextBox.text(), eosTopBody.attrs)
-            else:
-                if self.idTextBox.text() not in metaHtmlTree.find("head").find("title").contents[0]:
-                    raise ValueError("Metadata ID does not match entered ID")
-                medias = self.downloadRegularTease(rootDir, self.idTextBox.text(), metaHtmlTree)
-
-            self.downloadStatus.setText(lang.downloadingMedia)
-            with threadiprocessing.Pool(MEDIA_THREADS) as threadPool:
-                res = threadPool.starmap_async(self.downloadMedia, medias)
-                while not res.ready():
-                    res.wait(1)
-                    if self.downloadThread.stopped():
-                        logging.debug("Download Thread Stopping!")
-                        return
-                    
-            self.toAdd.append(rootDir)
-            self.downloadStatus.setText(lang.downloadComplete)
+    def start(self) -> bool:
+        """Starts downloading, unless the thread of the last start hasn't finished."""
+        if self.running:
+            logging.warning(f"Download of tease {self.teaseId} is still stopping")
+            return False
+        self.running = True
+        self.state = self.RUNNING
+        self.downloader = self.queue.creator.downloader.acquire()
+        self.thread = StoppableThread(target=self.run, name=f"Download-{self.teaseId}", daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        if self.thread is not None:
+            self.thread.stop()
+
+    def stopped(self) -> bool:
+        return self.thread.stopped()
+
+    # Called from the job's thread, the signal hands it to the GUI thread.
+    def setStatus(self, status: str):
+        self.status = status
+        self.queue.jobChanged.emit(self)
+
+    def run(self):
+        done = False
+        try:
+            done = self.downloadTease()
+        except requests.exceptions.JSONDecodeError:
+            logging.exception(f"Downloading tease {self.teaseId} failed")
+            self.setStatus(lang.downloadJsonError)
         except (OSError, IOError):
-            self.downloadStatus.setText(lang.downloadWriteError)
-            raise
+            logging.exception(f"Downloading tease {self.teaseId} failed")
+            self.setStatus(lang.downloadWriteError)
         except Exception:
-            self.downloadStatus.setText(lang.downloadUnknownError)
-            raise
+            logging.exception(f"Downloading tease {self.teaseId} failed")
+            self.setStatus(lang.downloadUnknownError)
         finally:
-            # TODO GIL Removal
-            self.idTextBox.setEnabled(True)
-            self.downloadButton.setEnabled(True)
-            self.downloadThread = None
-
-    def downloadMedia(self, file, url):
-        mediaReq = requests.get(url)
-        if mediaReq.status_code == HTTPStatus.FORBIDDEN:
-            logging.warning(f"Received HTTP 403 Forbidden for file {url}")
-            return
+            for future in self.mediaFutures.values():
+                future.cancel()
+            # Media being downloaded stops at the next chunk, but still writes to rootDir until then.
+            concurrent.futures.wait(self.mediaFutures.values())
+            self.downloader.release()
+            self.queue.jobFinished.emit(self, done)
+
+    def downloadTease(self) -> bool:
+        rootDir = self.rootDir
+        logging.debug(f"Using folder {rootDir} for downloading tease id {self.teaseId}.")
+        self.mediaFutures = dict()
+        if self.update and not os.path.isdir(rootDir):
+            # Recreating it would bring back a tease that was deleted.
+            logging.error(f"Can't update tease {self.teaseId}, {rootDir} doesn't exist anymore")
+            self.setStatus(lang.downloadTeaseMissing)
+            return False
+        os.makedirs(os.path.join(rootDir, "timg", "tb_xl"), exist_ok=True)
+
+        if self.stopped():
+            logging.debug("Download Thread Stopping!")
+            return False
         
-        if mediaReq.status_code != HTTPStatus.OK:
-            logging.warning(f"Error downloading media: {mediaReq.status_code=}, {mediaReq.reason=}")
-            return
+        if self.failedMedia:
+            medias = set(self.failedMedia)
+        elif self.update and os.path.isfile(os.path.join(rootDir, "eosscript.json")):
+            # Only the eosscript and the media it lacks are fetched again.
+            medias = self.downloadEosTease(rootDir, self.teaseId, None)
+        else:
+            medias = self.downloadTeasePages(rootDir)
+        if medias is None:
+            return False
+
+        self.setStatus(lang.downloadingMedia)
+        self.submitMedia(medias)
+        results = collections.Counter()
+        pending = set(self.mediaFutures.values())
+        while pending:
+            done, pending = concurrent.futures.wait(pending, 1)
+            results.update(future.result() for future in done)
+            self.setStatus(lang.downloadingMediaProgress % (len(self.mediaFutures) - len(pending), len(self.mediaFutures)))
+            if self.stopped():
+                logging.debug("Download Thread Stopping!")
+                return False
         
-        logging.debug(f"Writing file {file}")
+        self.failedMedia = [media for media, future in self.mediaFutures.items() if future.result() == self.MEDIA_FAILED]
+        logging.info(f"Media of tease {self.teaseId}: {results[self.MEDIA_DOWNLOADED]} downloaded, "
+                     f"{results[self.MEDIA_PRESENT]} already present, {results[self.MEDIA_FAILED]} failed")
+        if self.update:
+            self.setStatus(lang.downloadUpdated % (results[self.MEDIA_DOWNLOADED], results[self.MEDIA_PRESENT],
+                                                   results[self.MEDIA_FAILED]))
+        else:
+            self.setStatus(lang.downloadComplete)
+        return True
+
+    # Downloads the metadata and pages of the tease, returning its media.
+    def downloadTeasePages(self, rootDir) -> set[tuple[str, str]] | None:
+        logging.debug(f"Downloading metadata for {self.teaseId}.")
+        self.setStatus(lang.downloadingMeta)
+        metaReq = self.downloader.get(f"https://milovana.com/webteases/showtease.php?id={self.teaseId}", self.stopped)
+        if metaReq.status_code != HTTPStatus.OK:
+            self.setStatus(lang.downloadUnknownError)
+            logging.error(f"Error downloading metadata: {metaReq.status_code=}, {metaReq.reason=}")
+            return None
+        
+        if self.stopped():
+            logging.debug("Download Thread Stopping!")
+            return None
+        
+        metaHtmlTree = parsePage(metaReq.content.decode())
+
+        # Can't use status codes since the site always seems to return 200 if it's not down.
+        if (titleElem := metaHtmlTree.find("head").find("title").string) is not None:
+            if titleElem == "Milovana.com - This tease is invisible.":
+                self.setStatus(lang.downloadInvisibleTease)
+                logging.error(f"Tease ID {self.teaseId} is invisible.")
+                return None
+            elif titleElem == "Milovana.com - Tease not found.":
+                self.setStatus(lang.downloadInvalidId)
+                logging.error(f"Tease ID {self.teaseId} is invalid.")
+                return None
+
+        if (eosTopBody := metaHtmlTree.find("body", {"class": "eosTopBody"})) is not None:
+            if self.teaseId != eosTopBody.attrs["data-tease-id"]:
+                raise ValueError("Metadata ID does not match entered ID")
+            medias = self.downloadEosTease(rootDir, self.teaseId, eosTopBody.attrs)
+        else:
+            if self.teaseId not in metaHtmlTree.find("head").find("title").contents[0]:
+                raise ValueError("Metadata ID does not match entered ID")
+            medias = self.downloadRegularTease(rootDir, self.teaseId, metaHtmlTree)
+        return medias
+
+    # Starts downloading medias that haven't been started yet.
+    def submitMedia(self, medias: typing.Iterable[tuple[str, str]]):
+        for media in medias:
+            if media not in self.mediaFutures:
+                self.mediaFutures[media] = self.downloader.submit(self.downloadMedia, *media)
+    
+    def downloadMedia(self, file, url) -> str:
+        file = os.path.normpath(file)
+        if os.path.isfile(file):
+            # From before the download was paused, or an earlier download when updating.
+            # Media is named after its hash, so changed media gets a new name.
+            return self.MEDIA_PRESENT
+        mediaStore = self.queue.creator.mediaStore
+        if mediaStore is not None and mediaStore.link(os.path.basename(file), file):
+            logging.debug(f"Linked {file} from the media store")
+            return self.MEDIA_PRESENT
+        logging.debug(f"Downloading {url} to {file}")
         try:
-            with open(os.path.normpath(file), "wb") as media:
-                media.write(mediaReq.content)
+            if not self.downloader.download(url, file, self.stopped):
+                return self.MEDIA_FAILED
+            if mediaStore is not None:
+                mediaStore.add(file)
+            return self.MEDIA_DOWNLOADED
         except (OSError, IOError) as e:
             logging.warning(f"Error writing file {file}: {e}")
+        except requests.RequestException as e:
+            logging.warning(f"Error downloading media {url}: {e}")
+        return self.MEDIA_FAILED
     
+    # metadata is None when updating, which keeps the config.ini of the tease.
     def downloadEosTease(self, rootDir, teaseId, metadata) -> tuple[set[tuple[str, str]]]:
         try:
-            config = configparser.ConfigParser()
-            config["General"] = {
-                "title": metadata["data-title"],
-                "author": metadata["data-author"],
-                "preview": metadata["data-preview"],
-                "tease_id": metadata["data-tease-id"],
-                "author_id": metadata["data-author-id"]
-            }
-
-            with open(os.path.join(rootDir, "config.ini"), "w") as f:
-                EosTeaseCard.saveConfig(config, f)
-
-            if self.downloadThread.stopped():
+            if metadata is not None:
+                config = configparser.ConfigParser()
+                config["General"] = {
+                    "title": metadata["data-title"],
+                    "author": metadata["data-author"],
+                    "preview": metadata["data-preview"],
+                    "tease_id": metadata["data-tease-id"],
+                    "author_id": metadata["data-author-id"]
+                }
+
+                with open(os.path.join(rootDir, "config.ini"), "w") as f:
+                    EosTeaseCard.saveConfig(config, f)
+
+            if self.stopped():
                 logging.debug("Download Thread Stopping!")
                 return
             
             logging.debug(f"Downloading eosscript for {teaseId}.")
-            self.downloadStatus.setText(lang.downloadingScript)
-            eosscriptReq = requests.get(f"https://milovana.com/webteases/geteosscript.php?id={teaseId}")
+            self.setStatus(lang.downloadingScript)
+            eosscriptReq = self.downloader.get(f"https://milovana.com/webteases/geteosscript.php?id={teaseId}", self.stopped)
             if eosscriptReq.status_code != HTTPStatus.OK:
-                self.downloadStatus.setText(lang.downloadUnknownError)
+                self.setStatus(lang.downloadUnknownError)
                 logging.error(f"Network error {eosscriptReq.status_code} occurred when downloading eosscript.json:")
                 logging.error(f"{eosscriptReq.content=}")
                 logging.error(f"{eosscriptReq.reason=}")
                 return
             
             eosscript = eosscriptReq.json()
-            with open(os.path.join(rootDir, "eosscript.json"), "w") as jFile:
+            # Replaced in one go since the HTTP server may be serving the old one
+            with open(tmpPath := os.path.join(rootDir, "eosscript.json.tmp"), "w") as jFile:
                 json.dump(eosscript, jFile)
+            os.replace(tmpPath, os.path.join(rootDir, "eosscript.json"))
 
-            if self.downloadThread.stopped():
+            if self.stopped():
                 logging.debug("Download Thread Stopping!")
                 return
             
@@ -527,66 +1228,90 @@ class DownloadTeasePopup(QtWidgets.QDialog):
                     medias.add((os.path.join(rootDir, (file := mime2PathMap[f["type"]] % f["hash"])),
                                 f"https://media.milovana.com/{file}"))
                     
-            if self.downloadThread.stopped():
+            if self.stopped():
                 logging.debug("Download Thread Stopping!")
                 return
             
             return medias
         except requests.exceptions.JSONDecodeError:
-            self.downloadStatus.setText(lang.downloadJsonError)
+            self.setStatus(lang.downloadJsonError)
             logging.error(f"An error occurred when decoding eosscript.json.")
             raise
 
     def downloadRegularTease(self, rootDir, teaseId, fpHtmlTree) -> tuple[set[tuple[str, str]]]:
-        metaElem = fpHtmlTree.find("h1", {"id": "tease_title"})
-        title = metaElem.contents[0].strip()
-        author = metaElem.find("a").contents[0].strip()
-        config = configparser.ConfigParser()
-        config["General"] = {
-            "title": title,
-            "author": author,
-            "tease_id": teaseId
-        }
+        # Updates keep the config.ini of the tease, like downloadEosTease.
+        if not self.update:
+            metaElem = fpHtmlTree.find("h1", {"id": "tease_title"})
+            title = metaElem.contents[0].strip()
+            author = metaElem.find("a").contents[0].strip()
+            config = configparser.ConfigParser()
+            config["General"] = {
+                "title": title,
+                "author": author,
+                "tease_id": teaseId
+            }
 
-        with open(os.path.join(rootDir, "config.ini"), "w") as f:
-            RegularTeaseCard.saveConfig(config, f)
+            with open(os.path.join(rootDir, "config.ini"), "w") as f:
+                RegularTeaseCard.saveConfig(config, f)
 
-        if self.downloadThread.stopped():
+        if self.stopped():
             logging.debug("Download Thread Stopping!")
             return
         
         nextLinks, mediaLinks = self.saveHtml(rootDir, teaseId, fpHtmlTree, os.path.join(rootDir, "index.html"))
+        self.submitMedia(mediaLinks)
         
-        self.downloadStatus.setText(lang.downloadingHtml)
-        seenLinks = set()
-        while nextLinks:
-            if self.downloadThread.stopped():
-                logging.debug("Download Thread Stopping!")
-                return
-            
-            nextLink = nextLinks.pop()
-            if nextLink in seenLinks:
-                logging.debug(f"Skipping {nextLink} because it was already downloaded.")
-                continue
-            else:
-                seenLinks.add(nextLink)
-
-            logging.debug(f"Downloading {nextLink}")
-            pageReq = requests.get(nextLink[1])
-            if pageReq.status_code != HTTPStatus.OK:
-                logging.warning(f"Error downloading html: {pageReq.status_code=}, {pageReq.reason=}")
-                continue
-
-            pageHtmlTree = BeautifulSoup(pageReq.content.decode(), "html.parser")
-            try:
-                nextLinks_, mediaLinks_ = self.saveHtml(rootDir, teaseId, pageHtmlTree, nextLink[0])
-                nextLinks.update(nextLinks_)
-                mediaLinks.update(mediaLinks_)
-            except (OSError, IOError) as e:
-                logging.warning(f"Error writing file {os.path.join(rootDir, nextLink[0])}: {e}")
+        # Pages are fetched, parsed and saved on threads of their own while this
+        # one keeps the frontier. Media already queued on the downloader's pool
+        # would hold them up otherwise. Both share the per-host connection limit.
+        self.setStatus(lang.downloadingHtml)
+        maxPages = max(1, self.downloader.connectionsPerHost // 2)
+        crawlPool = concurrent.futures.ThreadPoolExecutor(maxPages, thread_name_prefix=f"Crawl-{teaseId}")
+        seenLinks = set(nextLinks)
+        frontier = list(nextLinks)
+        crawling: dict[concurrent.futures.Future, tuple[str, str]] = dict()
+        try:
+            while frontier or crawling:
+                while frontier and len(crawling) < maxPages:
+                    nextLink = frontier.pop()
+                    logging.debug(f"Downloading {nextLink}")
+                    crawling[crawlPool.submit(self.crawlPage, rootDir, teaseId, nextLink)] = nextLink
+                done, _ = concurrent.futures.wait(crawling, 1, concurrent.futures.FIRST_COMPLETED)
+                if self.stopped():
+                    logging.debug("Download Thread Stopping!")
+                    return
+                for future in done:
+                    nextLink = crawling.pop(future)
+                    try:
+                        nextLinks_, mediaLinks_ = future.result()
+                    except (OSError, IOError) as e:
+                        logging.warning(f"Error writing file {os.path.join(rootDir, nextLink[0])}: {e}")
+                        continue
+                    except requests.RequestException as e:
+                        logging.warning(f"Error downloading html {nextLink[1]}: {e}")
+                        continue
+                    self.submitMedia(mediaLinks_)
+                    mediaLinks.update(mediaLinks_)
+                    for link in nextLinks_ - seenLinks:
+                        seenLinks.add(link)
+                        frontier.append(link)
+        finally:
+            # Pages being crawled see self.stopped too. The job stays RUNNING,
+            # and its folder in use, until they have let go of it.
+            crawlPool.shutdown(wait=True, cancel_futures=True)
 
         return mediaLinks
     
+    # Runs on the crawl threads of downloadRegularTease.
+    def crawlPage(self, rootDir, teaseId, link: tuple[str, str]) -> tuple[set[tuple[str, str]], set[tuple[str, str]]]:
+        pageReq = self.downloader.get(link[1], self.stopped)
+        if pageReq.status_code != HTTPStatus.OK:
+            logging.warning(f"Error downloading html: {pageReq.status_code=}, {pageReq.reason=}")
+            return set(), set()
+
+        pageHtmlTree = parsePage(pageReq.content.decode())
+        return self.saveHtml(rootDir, teaseId, pageHtmlTree, link[0])
+    
     def saveHtml(self, rootDir, teaseId, htmlTree: BeautifulSoup, meFile) -> tuple[set[tuple[str, str]], set[tuple[str, str]]]:
         def getPageFilename(page):
             return f"{'page'+page if page else 'index'}.html"
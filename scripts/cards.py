@@ -1,91 +1,86 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
 import os
+import threading
 import typing
 
-from bs4 import BeautifulSoup
 from configparser import ConfigParser
 from io import StringIO
 from PyQt6 import QtGui, QtWidgets
 
 import english as lang
+import library
+
+from eosTransform import EosTransform, UNHIDE_TIMERS
 
 from app import AppWindow
 from constants import *
 
-class TeaseCard(QtWidgets.QWidget):
+# Tease cards hold the data for one row of AppWindow's tease list,
+# which TeaseCardDelegate paints. They are not widgets themselves.
+class TeaseCard:
     MY_FANCY_NAME = "Generic Tease Card"
     DEFAULT_THUMB = DEFAULT_THUMB_PATH
 
-    def __init__(self, creator: AppWindow, rootDir: os.PathLike):
+    # metadata comes from library.scanTease. If it is None, the card
+    # is a placeholder until applyMetadata is called.
+    def __init__(self, creator: AppWindow, rootDir: os.PathLike, metadata: dict | None = None):
         logging.debug(f"Creating tease card of type {type(self)} with {rootDir=}")
-        super().__init__(creator)
-        palette = self.palette()
-        palette.setColor(self.backgroundRole(), palette.color(QtGui.QPalette.ColorRole.Highlight))
-        self.setPalette(palette)
         self.creator = creator
         self.rootDir = rootDir
-        self.config: ConfigParser = self._loadConfig()
+        self.loaded = False
+        self.metadata: dict = None
+        self.config = ConfigParser()
+        self.config["General"] = {
+            "title": os.path.basename(rootDir),
+            "author": lang.loadingTease,
+            "tease_id": "unset"
+        }
+        self.thumbnail: QtGui.QPixmap = self.getDefaultThumbnail()
+
+        if metadata is not None:
+            self.applyMetadata(metadata)
+    
+    def applyMetadata(self, metadata: dict):
+        self.metadata = metadata
+        self.config = self.loadConfig(StringIO(metadata["config"]))
         if "tease_id" not in self.config["General"]:
             self.config["General"]["tease_id"] = "unset"
-
-        self.settingsPopup: TeaseSettingsPopup = None
-
-        self.thumbnail = QtWidgets.QLabel(self)
-        self.thumbnail.setPixmap(self.getDefaultThumbnail())
-
-        self.teaseTitle = QtWidgets.QLabel(self)
-        titleFont = self.teaseTitle.font()
-        titleFont.setPointSize(14)
-        self.teaseTitle.setFont(titleFont)
-
-        self.teaseAuthor = QtWidgets.QLabel(self)
-        authorFont = self.teaseAuthor.font()
-        authorFont.setPointSize(11)
-        self.teaseAuthor.setFont(authorFont)
-
-        self.extraInfo = QtWidgets.QLabel(self)
-        extraInfoFont = self.extraInfo.font()
-        extraInfoFont.setPointSize(9)
-        extraInfoFont.setItalic(True)
-        self.extraInfo.setFont(extraInfoFont)
-
-        metadataSubLayout = QtWidgets.QVBoxLayout()
-        metadataSubLayout.addWidget(self.teaseTitle)
-        metadataSubLayout.addWidget(self.teaseAuthor)
-        metadataSubLayout.addWidget(self.extraInfo)
-        metadataSubLayout.addStretch(1)
-
-        layout = QtWidgets.QHBoxLayout()
-        layout.addWidget(self.thumbnail)
-        layout.addLayout(metadataSubLayout)
-        layout.addStretch()
-
+        self.loaded = True
         self.refreshMetadata()
-
-        self.setLayout(layout)
+        if metadata["thumbnail"] is not None:
+            # Arrives through setThumbnail
+            self.creator.thumbnailCache.request(self.rootDir, metadata["thumbnail"])
     
     def saveSettings(self):
         self._saveConfig()
+        self.metadata["signature"] = library.getTeaseSignature(self.rootDir)
+        self.creator.teaseChanged(self)
         self.refreshMetadata()
     
     def refreshMetadata(self):
-        self.teaseTitle.setText(self.config["General"]["title"])
-        self.teaseAuthor.setText(self.config["General"]["author"])
-        self.extraInfo.setText(" | ".join([self.config["General"]["tease_id"], self.MY_FANCY_NAME]))
+        self.creator.teaseListModel.teaseChanged(self)
     
-    def getThumbnail(self) -> QtGui.QPixmap | None:
-        return self.getDefaultThumbnail()
+    def getExtraInfo(self) -> str:
+        return " | ".join([self.config["General"]["tease_id"], self.MY_FANCY_NAME])
+    
+    def setThumbnail(self, thumbnail: QtGui.QImage):
+        self.thumbnail = QtGui.QPixmap.fromImage(thumbnail)
+        self.refreshMetadata()
     
-    def mousePressEvent(self, event):
-        self.creator.setSelectedTease(self)
-        return super().mousePressEvent(event)
+    @classmethod
+    def getSettingsPopupType(cls) -> type[TeaseSettingsPopup]:
+        return TeaseSettingsPopup
     
     def _saveConfig(self):
+        with StringIO() as configgy:
+            self.saveConfig(self.config, configgy)
+            self.metadata["config"] = configgy.getvalue()
         with open(os.path.join(self.rootDir, "config.ini"), "w") as f:
-            self.saveConfig(self.config, f)
+            f.write(self.metadata["config"])
     
     def _loadConfig(self) -> ConfigParser:
         with open(os.path.join(self.rootDir, "config.ini")) as f:
@@ -108,7 +103,7 @@ class TeaseCard(QtWidgets.QWidget):
             (thumbnail.width() - dim) // 2,  # top left x
             (thumbnail.height() - dim) // 2,  # top left y
             dim, dim  # width, height
-        ).scaledToHeight(80)
+        ).scaledToHeight(THUMBNAIL_SIZE)
 
     @staticmethod
     def saveConfig(config: ConfigParser, file: typing.TextIO):
@@ -128,12 +123,14 @@ class TeaseCard(QtWidgets.QWidget):
         config.read_string(configgy)
         return config
     
+# One popup of each type is shared by every card of that type, see AppWindow.getSettingsPopup.
 class TeaseSettingsPopup(QtWidgets.QDialog):
-    def __init__(self, creator: TeaseCard):
+    def __init__(self, creator: AppWindow):
         super().__init__(creator)
         self.setMinimumWidth(4 * WINDOW_SIZE)
         self.setModal(True)
         self.creator = creator
+        self.tease: TeaseCard = None
 
         self.layout_ = QtWidgets.QGridLayout(self)
         self.setLayout(self.layout_)
@@ -159,110 +156,74 @@ class TeaseSettingsPopup(QtWidgets.QDialog):
         self.layout_.addWidget(saveSettingsButton, 10, 0, 1, 2)
     
     def saveSettings(self):
-        self.creator.config["General"]["title"] = self.teaseTitleEdit.text()
-        self.creator.config["General"]["author"] = self.teaseAuthorEdit.text()
-        self.creator.config["General"]["tease_id"] = self.teaseIdEdit.text()
-        self.creator.saveSettings()
+        self.tease.config["General"]["title"] = self.teaseTitleEdit.text()
+        self.tease.config["General"]["author"] = self.teaseAuthorEdit.text()
+        self.tease.config["General"]["tease_id"] = self.teaseIdEdit.text()
+        self.tease.saveSettings()
         self.hide()
 
+    def setTease(self, tease: TeaseCard):
+        self.tease = tease
+
     def refreshSettings(self):
-        self.teaseTitleEdit.setText(self.creator.config["General"]["title"])
-        self.teaseAuthorEdit.setText(self.creator.config["General"]["author"])
-        self.teaseIdEdit.setText(self.creator.config["General"]["tease_id"])
-        self.setWindowTitle(f"{lang.teaseSettings}: {self.creator.config['General']['title']}")
+        self.teaseTitleEdit.setText(self.tease.config["General"]["title"])
+        self.teaseAuthorEdit.setText(self.tease.config["General"]["author"])
+        self.teaseIdEdit.setText(self.tease.config["General"]["tease_id"])
+        self.setWindowTitle(f"{lang.teaseSettings}: {self.tease.config['General']['title']}")
 
 class EosTeaseCard(TeaseCard):
     MY_FANCY_NAME = "EOS Tease Card"
 
-    def __init__(self, creator: AppWindow, rootDir: os.PathLike):
-        super().__init__(creator, rootDir)
+    def __init__(self, creator: AppWindow, rootDir: os.PathLike, metadata: dict | None = None):
+        super().__init__(creator, rootDir, metadata)
+        # The eosscript itself lives in creator.eosscriptCache while it's being served.
+        self.eosscriptLock = threading.Lock()
+    
+    def applyMetadata(self, metadata: dict):
+        super().applyMetadata(metadata)
         if "unhide_timers" not in self.config["General"]:
             self.config["General"]["unhide_timers"] = "false"
-
-        self.settingsPopup = EosTeaseSettingsPopup(self)
-        self.eosscript = self.loadEosscript()
-        if (thumbnail := self.getThumbnail()) is not None:
-            self.thumbnail.setPixmap(thumbnail)
+    
+    @classmethod
+    def getSettingsPopupType(cls) -> type[TeaseSettingsPopup]:
+        return EosTeaseSettingsPopup
     
     def saveSettings(self):
-        self.eosscript = self.loadEosscript()
-        logging.debug(f"Reloaded eosscript for {self.rootDir} with {self.config['General']['unhide_timers']=}")
+        if self.getEosTransform() is None:
+            # Served from disk again
+            self.creator.eosscriptCache.discard(self.rootDir)
         return super().saveSettings()
     
-    def loadEosscript(self) -> typing.Any:
-        with open(os.path.join(self.rootDir, "eosscript.json")) as f:
-            eosscript = json.load(f)
+    # The rewrites the settings ask for, None if the eosscript is served as is.
+    def getEosTransform(self) -> EosTransform | None:
         if self.config["General"].getboolean("unhide_timers"):
-            logging.debug(f"Hiding timers for {self.rootDir}")
-            self.removeTags(("nyx.timer/style", "timer/style"), eosscript)
-        return eosscript
+            return UNHIDE_TIMERS
+        return None
     
-    def getThumbnail(self) -> QtGui.QPixmap | None:
-        imgHash = None
-        if (imgLocator := self.findFirstImage(self.eosscript["pages"]["start"])) is not None:
-            if imgLocator.startswith("gallery:"):
-                galId, imgId = imgLocator[len("gallery:"):].split("/", 1)
-                for i in self.eosscript["galleries"][galId]["images"]:
-                    # Using str() instead of int() to help prevent errors
-                    if str(i["id"]) == imgId or imgId == "*":
-                        imgHash = i["hash"]
-                        break
-                else:
-                    logging.warning(f"Could not find thumbnail in eosscript galleries for {self.rootDir}")
-            elif imgLocator.startswith("file:"):
-                imgHash = self.eosscript["files"][imgLocator[len("file:"):]]["hash"]
-        else:
-            logging.warning(f"Could not find thumbnail in eosscript for {self.rootDir}")
-        
-        if imgHash is None:
-            logging.warning(f"Unknown image locator: {imgLocator}")
+    def loadEosscript(self) -> typing.Any:
+        with open(os.path.join(self.rootDir, "eosscript.json"), "rb") as f:
+            if (transform := self.getEosTransform()) is None:
+                return json.load(f)
+            logging.debug(f"Applying {transform.name} to {self.rootDir}")
+            return transform.loads(f.read())
+    
+    def getServedEosscript(self) -> tuple[bytes, str] | None:
+        """Returns the encoded eosscript and its ETag for the HTTP server,
+        or None if eosscript.json on disk can be served as is."""
+        # Called from the HTTP server's worker threads.
+        if (transform := self.getEosTransform()) is None:
             return None
-
-        for img in os.listdir(imgDir := os.path.join(self.rootDir, "timg", "tb_xl")):
-            if img.startswith(imgHash):
-                return self.cropThumbnail(QtGui.QPixmap(os.path.join(imgDir, img)))
-
-        logging.warning(f"Could not find thumbnail in media for {self.rootDir}")
-        return None
+        # The lock keeps concurrent requests from encoding the same eosscript twice.
+        with self.eosscriptLock:
+            return self.creator.eosscriptCache.get(self.rootDir, transform.name, self.encodeEosscript)
     
-    @classmethod
-    def findFirstImage(cls, eosFrag) -> str | None:
-        if isinstance(eosFrag, dict):
-            if "image" in eosFrag:
-                return eosFrag["image"]["locator"]
-            elif "media" in eosFrag and "nyx.image" in eosFrag["media"]:
-                return eosFrag["media"]["nyx.image"]
-            for frag in eosFrag.values():
-                if (res := cls.findFirstImage(frag)) is not None:
-                    return res
-        elif isinstance(eosFrag, list):
-            for frag in eosFrag:
-                if (res := cls.findFirstImage(frag)) is not None:
-                    return res
-        return None
-
-    @classmethod
-    def removeTags(cls, tags: tuple[str], eosFrag):
-        if isinstance(eosFrag, dict):
-            for tag in tags:
-                path = tag.split("/")
-                tmp = eosFrag
-                for key in path[:-1]:
-                    if key in tmp:
-                        tmp = tmp[key]
-                    else:
-                        break
-                else:
-                    if path[-1] in tmp:
-                        del tmp[path[-1]]
-            for frag in eosFrag.values():
-                cls.removeTags(tags, frag)
-        elif isinstance(eosFrag, list):
-            for frag in eosFrag:
-                cls.removeTags(tags, frag)
+    def encodeEosscript(self) -> tuple[bytes, str]:
+        logging.debug(f"Encoding eosscript for {self.rootDir}")
+        encoded = json.dumps(self.loadEosscript(), separators=(",", ":")).encode()
+        return encoded, f'"{hashlib.sha1(encoded).hexdigest()}"'
 
 class EosTeaseSettingsPopup(TeaseSettingsPopup):
-    def __init__(self, creator: EosTeaseCard):
+    def __init__(self, creator: AppWindow):
         super().__init__(creator)
 
         self.unhideTimersButton = QtWidgets.QCheckBox(lang.unhideTimers, self)
@@ -273,35 +234,21 @@ class EosTeaseSettingsPopup(TeaseSettingsPopup):
     
     def saveSettings(self):
         # Need to use .lower() so that eos.outer.js can read it properly
-        self.creator.config["General"]["unhide_timers"] = str(self.unhideTimersButton.isChecked()).lower()
-        self.creator.config["General"]["preview"] = str(self.debugModeButton.isChecked()).lower()
+        self.tease.config["General"]["unhide_timers"] = str(self.unhideTimersButton.isChecked()).lower()
+        self.tease.config["General"]["preview"] = str(self.debugModeButton.isChecked()).lower()
         return super().saveSettings()
     
     def refreshSettings(self):
-        self.unhideTimersButton.setChecked(self.creator.config["General"].getboolean("unhide_timers"))
-        self.debugModeButton.setChecked(self.creator.config["General"].getboolean("preview"))
+        self.unhideTimersButton.setChecked(self.tease.config["General"].getboolean("unhide_timers"))
+        self.debugModeButton.setChecked(self.tease.config["General"].getboolean("preview"))
         return super().refreshSettings()
 
 class RegularTeaseCard(TeaseCard):
     MY_FANCY_NAME = "Regular Tease Card"
 
-    def __init__(self, creator, rootDir):
-        super().__init__(creator, rootDir)
-        self.settingsPopup = RegularTeaseSettingsPopup(self)
-        if (thumbnail := self.getThumbnail()) is not None:
-            self.thumbnail.setPixmap(thumbnail)
-    
-    def getThumbnail(self) -> QtGui.QPixmap | None:
-        with open(os.path.join(self.rootDir, "index.html")) as f:
-            htmlTree = BeautifulSoup(f, "html.parser")
-        # If I cannot chain far too many methods (in multiple lines) at once, this happens.
-        htmlTree = htmlTree.find("html", recursive=False)
-        htmlTree = htmlTree.find("body", recursive=False)
-        htmlTree = htmlTree.find("div", {"id": "cm_wide"})
-        for link in htmlTree.find_all("img", src=True):
-            if "timg/tb_xl" in link["src"]:
-                return self.cropThumbnail(QtGui.QPixmap(os.path.join(self.rootDir, link["src"])))
-        return None
+    @classmethod
+    def getSettingsPopupType(cls) -> type[TeaseSettingsPopup]:
+        return RegularTeaseSettingsPopup
 
 class RegularTeaseSettingsPopup(TeaseSettingsPopup):
     pass
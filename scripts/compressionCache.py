@@ -0,0 +1,182 @@
+import concurrent.futures
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class CompressionCache:
+    """Keeps gzip (and brotli, if installed) variants of compressible responses.
+
+    Variants live in cacheDir, in one folder per source folder, and are
+    named after the source file and its ETag. A changed source simply
+    misses the cache and the stale variant is removed when the new one is
+    written. Misses are compressed on a background thread, so the request
+    that missed is sent uncompressed rather than waiting.
+    """
+    # Encodings in order of preference
+    ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+    EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+    COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json",
+                          "application/xml", "image/svg+xml")
+    MIN_SIZE = 1024
+    GZIP_LEVEL = 9
+    BROTLI_QUALITY = 9
+
+    def __init__(self, cacheDir: os.PathLike):
+        self.cacheDir = cacheDir
+        self.pool = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="Compress")
+        # Variants waiting for the pool
+        self.pending: set[str] = set()
+        self.lock = threading.Lock()
+
+    def isCompressible(self, ctype: str, size: int) -> bool:
+        return size >= self.MIN_SIZE and ctype.startswith(self.COMPRESSIBLE_TYPES)
+
+    def chooseEncoding(self, acceptEncoding: str | None) -> str | None:
+        """Picks the preferred encoding allowed by an Accept-Encoding header."""
+        if not acceptEncoding:
+            return None
+        qvalues: dict[str, float] = dict()
+        for coding in acceptEncoding.split(","):
+            coding, _, params = coding.partition(";")
+            q = 1.0
+            for param in params.split(";"):
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            qvalues[coding.strip().lower()] = q
+        best, bestQ = None, 0.0
+        for encoding in self.ENCODINGS:
+            if (q := qvalues.get(encoding, qvalues.get("*", 0.0))) > bestQ:
+                best, bestQ = encoding, q
+        return best
+
+    @staticmethod
+    def variantETag(etag: str, encoding: str) -> str:
+        return f'{etag[:-1]}-{encoding}"'
+
+    @staticmethod
+    def hashName(name: os.PathLike, length: int) -> str:
+        return hashlib.sha1(os.fsencode(name)).hexdigest()[:length]
+
+    def getGroupDir(self, directory: os.PathLike) -> str:
+        return os.path.join(self.cacheDir, self.hashName(directory, 20))
+
+    def getVariantPath(self, path: os.PathLike, etag: str, encoding: str) -> str:
+        name = f"{self.hashName(os.path.basename(path), 12)}.{self.hashName(etag, 12)}{self.EXTENSIONS[encoding]}"
+        return os.path.join(self.getGroupDir(os.path.dirname(path)), name)
+
+    def getVariant(self, path: os.PathLike, etag: str, encoding: str, data: bytes | None = None) -> str | None:
+        """Returns the path of the encoded variant of path at etag, or None while it is created.
+
+        data is the identity body when it isn't simply the file at path,
+        e.g. an eosscript that was modified in memory.
+        """
+        variant = self.getVariantPath(path, etag, encoding)
+        if os.path.isfile(variant):
+            return variant
+        with self.lock:
+            if variant in self.pending:
+                return None
+            self.pending.add(variant)
+        try:
+            self.pool.submit(self.createVariant, path, etag, encoding, data)
+        except RuntimeError:
+            # Shut down along with the server
+            with self.lock:
+                self.pending.discard(variant)
+        return None
+
+    def createVariant(self, path: os.PathLike, etag: str, encoding: str, data: bytes | None = None) -> str | None:
+        """Compresses path at etag with encoding unless the variant exists, returning its path."""
+        variant = self.getVariantPath(path, etag, encoding)
+        try:
+            if os.path.isfile(variant):
+                return variant
+            logging.debug(f"Compressing {path} with {encoding}")
+            os.makedirs(groupDir := os.path.dirname(variant), exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=groupDir, suffix=".tmp", delete=False) as tmp:
+                try:
+                    if data is not None:
+                        tmp.write(self.compress(data, encoding))
+                    else:
+                        with open(path, "rb") as src:
+                            self.compressFile(src, tmp, encoding)
+                except:
+                    tmp.close()
+                    os.remove(tmp.name)
+                    raise
+            os.replace(tmp.name, variant)
+
+            # Drop variants of older versions of the same file.
+            prefix = os.path.basename(variant).split(".")[0]
+            with os.scandir(groupDir) as entries:
+                for entry in entries:
+                    if entry.name.startswith(prefix) and entry.name.endswith(self.EXTENSIONS[encoding]) and \
+                          entry.path != variant:
+                        try:
+                            os.remove(entry.path)
+                        except OSError:
+                            pass
+            return variant
+        except OSError as e:
+            logging.warning(f"Could not write compressed variant of {path}: {e}")
+            return None
+        finally:
+            with self.lock:
+                self.pending.discard(variant)
+
+    def discard(self, directory: os.PathLike):
+        """Deletes the variants of the files in directory, e.g. a tease that was deleted."""
+        shutil.rmtree(self.getGroupDir(directory), ignore_errors=True)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def precompress(self, directory: os.PathLike, etagFor):
+        """Creates every variant for the compressible files under directory.
+
+        etagFor maps an os.stat_result to the ETag the server would send.
+        """
+        for root, _, files in os.walk(directory):
+            for file in files:
+                path = os.path.join(root, file)
+                ctype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                try:
+                    fs = os.stat(path)
+                except OSError:
+                    continue
+                if not self.isCompressible(ctype, fs.st_size):
+                    continue
+                for encoding in self.ENCODINGS:
+                    self.createVariant(path, etagFor(fs), encoding)
+        logging.debug(f"Finished precompressing {directory}")
+
+    @classmethod
+    def compress(cls, data: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(data, quality=cls.BROTLI_QUALITY)
+        return gzip.compress(data, cls.GZIP_LEVEL, mtime=0)
+
+    @classmethod
+    def compressFile(cls, src, dest, encoding: str):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=cls.BROTLI_QUALITY)
+            while chunk := src.read(1 << 20):
+                dest.write(compressor.process(chunk))
+            dest.write(compressor.finish())
+        else:
+            with gzip.GzipFile(filename="", fileobj=dest, mode="wb", compresslevel=cls.GZIP_LEVEL, mtime=0) as gz:
+                shutil.copyfileobj(src, gz)
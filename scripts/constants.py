@@ -4,10 +4,36 @@ from os.path import normpath
 #########################################################################
 VERSION = 3.3
 TEASES_DIR = normpath("teases")
+LIBRARY_INDEX_PATH = normpath("teases/library.json")
+DOWNLOAD_QUEUE_PATH = normpath("teases/downloads.json")
+MEDIA_STORE_DIR = normpath("teases/.media")
+# Deleted teases until their files are gone, on the same filesystem as the teases
+TRASH_DIR = normpath("teases/.trash")
 COMMON_DIR = normpath("common")
+CACHE_DIR = normpath("cache")
+COMPRESSION_CACHE_DIR = normpath("cache/compressed")
+THUMBNAIL_CACHE_DIR = normpath("cache/thumbnails")
+FULL_TEXT_INDEX_PATH = normpath("cache/fulltext.json")
 DEFAULT_THUMB_PATH = normpath("icons/default_thumb.png")
 SEARCH_ICON_PATH = normpath("icons/search.svg")
 WINDOW_SIZE = 100
-MEDIA_THREADS = 2
+SEARCH_DEBOUNCE_MS = 150
+THUMBNAIL_SIZE = 80
+THUMBNAIL_THREADS = 4
+IMPORT_THREADS = 4
+DOWNLOAD_CONNECTIONS = 8
+# Requests started per second to one host
+DOWNLOAD_RATE = 20
+# Teases downloaded at the same time
+DOWNLOAD_TEASES = 2
+# Suffix of files that are still being downloaded
+PARTIAL_SUFFIX = ".part"
+HTTP_WORKERS = 8
+EOSSCRIPT_CACHE_MB = 64
+# Regexes for URL paths that are named by their content hash
+IMMUTABLE_PATHS = (
+    r"/static/(js|css|media)/[^/]+\.[0-9a-f]{8}(\.chunk)?\.\w+$",  # main.436d0fd2.chunk.js
+    r"/timg/(tb_xl/)?[0-9A-Za-z]{16,}\.\w+$",  # Milovana media hashes
+)
 
 del normpath
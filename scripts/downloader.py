@@ -0,0 +1,308 @@
+import concurrent.futures
+import contextlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+import typing
+import urllib.parse
+
+import requests
+import requests.adapters
+
+from http import HTTPStatus
+
+from constants import PARTIAL_SUFFIX
+
+# Responses that mean the server is overloaded or throttling us
+THROTTLE_STATUSES = (HTTPStatus.FORBIDDEN, HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.INTERNAL_SERVER_ERROR,
+                     HTTPStatus.BAD_GATEWAY, HTTPStatus.SERVICE_UNAVAILABLE, HTTPStatus.GATEWAY_TIMEOUT)
+# Errors after which the same request may still succeed
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+class HostLimiter:
+    """Adapts how many requests go to one host at once, and how often they start.
+
+    The limit grows by one per limit healthy responses and halves when the
+    host throttles or fails (additive increase, multiplicative decrease),
+    staying between 1 and maxLimit. Responses slower than SLOW_LATENCY
+    hold it where it is. A token bucket keeps requests from starting
+    faster than rate per second, and a Retry-After header holds all of
+    them back for as long as the server asks.
+    """
+    # Seconds until the response headers arrive
+    SLOW_LATENCY = 5
+    # Seconds between two decreases, so one burst of errors halves the limit once
+    DECREASE_INTERVAL = 2
+
+    def __init__(self, maxLimit: int, rate: float):
+        self.maxLimit = maxLimit
+        self.limit = float(max(1, maxLimit // 2))
+        self.inFlight = 0
+        self.rate = rate
+        # Enough tokens to fill every connection at once
+        self.burst = maxLimit
+        self.tokens = float(self.burst)
+        self.refilled = time.monotonic()
+        self.blockedUntil = 0.0
+        self.decreased = 0.0
+        self.condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def slot(self):
+        with self.condition:
+            while self.inFlight >= int(self.limit):
+                self.condition.wait()
+            self.inFlight += 1
+        try:
+            time.sleep(self.takeToken())
+            yield
+        finally:
+            with self.condition:
+                self.inFlight -= 1
+                self.condition.notify()
+
+    def setMaxLimit(self, maxLimit: int):
+        with self.condition:
+            self.maxLimit = self.burst = maxLimit
+            self.limit = min(self.limit, maxLimit)
+            self.condition.notify_all()
+
+    def takeToken(self) -> float:
+        """Takes the next token, returning how long to wait until it is due."""
+        with self.condition:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+            self.refilled = now
+            # Going negative reserves a later token.
+            self.tokens -= 1
+            return max(-self.tokens / self.rate, self.blockedUntil - now, 0)
+
+    def onResponse(self, response: requests.Response, latency: float):
+        if response.status_code in THROTTLE_STATUSES:
+            self.decrease(getRetryAfter(response))
+        elif latency < self.SLOW_LATENCY:
+            with self.condition:
+                if self.limit < self.maxLimit:
+                    self.limit = min(self.maxLimit, self.limit + 1 / self.limit)
+                    self.condition.notify()
+
+    def decrease(self, retryAfter: float | None = None):
+        with self.condition:
+            now = time.monotonic()
+            if retryAfter is not None:
+                self.blockedUntil = max(self.blockedUntil, now + retryAfter)
+            if now - self.decreased >= self.DECREASE_INTERVAL:
+                self.decreased = now
+                self.limit = max(1.0, self.limit / 2)
+                logging.debug(f"Throttled, allowing {int(self.limit)} connections")
+
+def getRetryAfter(response: requests.Response) -> float | None:
+    """Seconds the server asked us to wait. HTTP dates aren't supported."""
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+class Downloader:
+    """One connection-pooled HTTP session shared by every download.
+
+    Connections are kept alive between requests, and the HostLimiter of
+    each host decides how many of them may be in flight, never more than
+    connectionsPerHost no matter how many threads use the session. Failed
+    and throttled requests are retried after a jittered exponential
+    backoff. submit runs work such as media downloads on the downloader's
+    own thread pool.
+
+    A Downloader that replaces previous shares its HostLimiters, so the
+    per-host limit holds across both while jobs that acquired previous
+    finish with it.
+    """
+    TIMEOUT = 60
+    CHUNK_SIZE = 64 * 1024
+    # Tries per request. Interrupted files resume where the last try stopped.
+    ATTEMPTS = 5
+    # Seconds of the first backoff, which doubles on every try up to BACKOFF_MAX
+    BACKOFF = 1
+    BACKOFF_MAX = 60
+    CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-\d+/(\d+|\*)")
+
+    def __init__(self, connectionsPerHost: int, requestsPerSecond: float, previous: "Downloader | None" = None):
+        self.connectionsPerHost = connectionsPerHost
+        self.requestsPerSecond = requestsPerSecond
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=connectionsPerHost, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if previous is None:
+            self.hosts: dict[str, HostLimiter] = dict()
+            self.hostsLock = threading.Lock()
+        else:
+            self.hosts = previous.hosts
+            self.hostsLock = previous.hostsLock
+            with self.hostsLock:
+                # Hosts that previous still adds get the new limit too.
+                previous.connectionsPerHost = connectionsPerHost
+                for host in self.hosts.values():
+                    host.setMaxLimit(connectionsPerHost)
+        self.pool = concurrent.futures.ThreadPoolExecutor(connectionsPerHost, thread_name_prefix="Download")
+        # Jobs that acquired it and didn't release it yet
+        self.users = 0
+        self.closing = False
+        self.usersLock = threading.Lock()
+
+    def get(self, url: str, stopped: typing.Callable[[], bool] = lambda: False, **kwargs) -> requests.Response:
+        """requests.get through the shared session.
+
+        Throttled responses are retried, and the last one is returned if
+        they all were.
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        host = self.getHost(url)
+        for attempt in range(1, self.ATTEMPTS + 1):
+            error = None
+            try:
+                with host.slot():
+                    response = self.request(host, url, **kwargs)
+                if response.status_code not in THROTTLE_STATUSES or attempt == self.ATTEMPTS:
+                    return response
+                logging.warning(f"Request for {url} throttled ({attempt}/{self.ATTEMPTS}): {response.status_code=}")
+                retryAfter = getRetryAfter(response)
+            except RETRY_ERRORS as e:
+                if attempt == self.ATTEMPTS:
+                    raise
+                logging.warning(f"Request for {url} failed ({attempt}/{self.ATTEMPTS}): {e}")
+                error, retryAfter = e, None
+            if not self.backoff(attempt, retryAfter, stopped):
+                if error is not None:
+                    raise error
+                return response
+
+    def download(self, url: str, path: os.PathLike, stopped: typing.Callable[[], bool] = lambda: False) -> bool:
+        """Streams url into path, returning whether it was downloaded.
+
+        The body goes to path + PARTIAL_SUFFIX first and is only renamed to
+        path once complete. An existing partial file is resumed with a
+        Range request, and so is one left behind by a dropped connection.
+        If stopped returns True, the partial file is kept for later.
+        """
+        partPath = f"{path}{PARTIAL_SUFFIX}"
+        for attempt in range(1, self.ATTEMPTS + 1):
+            retryAfter = None
+            try:
+                if (response := self._download(url, partPath, stopped)) is None:
+                    if stopped():
+                        return False
+                    os.replace(partPath, path)
+                    return True
+                if response.status_code not in THROTTLE_STATUSES:
+                    logging.warning(f"Error downloading {url}: {response.status_code=}, {response.reason=}")
+                    return False
+                logging.warning(f"Download of {url} throttled ({attempt}/{self.ATTEMPTS}): {response.status_code=}")
+                retryAfter = getRetryAfter(response)
+            except RETRY_ERRORS as e:
+                logging.warning(f"Download of {url} interrupted ({attempt}/{self.ATTEMPTS}): {e}")
+            if attempt == self.ATTEMPTS or not self.backoff(attempt, retryAfter, stopped):
+                return False
+        return False
+
+    # Returns None once partPath is complete or stopped returns True, otherwise the unusable response.
+    def _download(self, url: str, partPath: os.PathLike, stopped: typing.Callable[[], bool]) -> requests.Response | None:
+        try:
+            offset = os.path.getsize(partPath)
+        except OSError:
+            offset = 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        host = self.getHost(url)
+        with host.slot(), self.request(host, url, headers=headers, stream=True, timeout=self.TIMEOUT) as response:
+            if response.status_code == HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE and \
+                  response.headers.get("Content-Range") == f"bytes */{offset}":
+                # The partial file already has everything.
+                return None
+            if response.status_code == HTTPStatus.PARTIAL_CONTENT and \
+                  (match := self.CONTENT_RANGE_RE.fullmatch(response.headers.get("Content-Range", ""))) and \
+                  int(match[1]) == offset:
+                logging.debug(f"Resuming {url} at byte {offset}")
+                mode = "ab"
+            elif response.status_code == HTTPStatus.OK:
+                mode = "wb"
+            elif offset and response.status_code in (HTTPStatus.PARTIAL_CONTENT,
+                                                     HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE):
+                # The server's file doesn't continue the partial one, e.g. it is shorter.
+                mode = None
+            else:
+                return response
+            if mode is not None:
+                with open(partPath, mode) as f:
+                    for chunk in response.iter_content(self.CHUNK_SIZE):
+                        if stopped():
+                            return None
+                        f.write(chunk)
+                return None
+        logging.warning(f"Can't resume {url} at byte {offset}, downloading it again: {response.status_code=}, "
+                        f"Content-Range {response.headers.get('Content-Range')}")
+        os.remove(partPath)
+        # Without a partial file this is a plain GET, so it can't come back here.
+        return self._download(url, partPath, stopped)
+
+    def request(self, host: HostLimiter, url: str, **kwargs) -> requests.Response:
+        """session.get, telling host how it went. Call it within host.slot()."""
+        start = time.monotonic()
+        try:
+            response = self.session.get(url, **kwargs)
+        except RETRY_ERRORS:
+            host.decrease()
+            raise
+        host.onResponse(response, time.monotonic() - start)
+        return response
+
+    def backoff(self, attempt: int, retryAfter: float | None, stopped: typing.Callable[[], bool]) -> bool:
+        """Waits before try attempt + 1, returning False if stopped meanwhile."""
+        if retryAfter is None:
+            # Full jitter keeps retrying threads from hitting the host together.
+            retryAfter = random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF * 2 ** attempt))
+        deadline = time.monotonic() + min(retryAfter, self.BACKOFF_MAX)
+        while (remaining := deadline - time.monotonic()) > 0:
+            if stopped():
+                return False
+            time.sleep(min(remaining, 0.25))
+        return not stopped()
+
+    def submit(self, fn: typing.Callable, *args, **kwargs) -> concurrent.futures.Future:
+        return self.pool.submit(fn, *args, **kwargs)
+
+    def getHost(self, url: str) -> HostLimiter:
+        name = urllib.parse.urlsplit(url).netloc
+        with self.hostsLock:
+            if (host := self.hosts.get(name)) is None:
+                host = self.hosts[name] = HostLimiter(self.connectionsPerHost, self.requestsPerSecond)
+            return host
+
+    def acquire(self) -> "Downloader":
+        """Keeps it open for a job until release, even if it is closed without cancel meanwhile."""
+        with self.usersLock:
+            self.users += 1
+        return self
+
+    def release(self):
+        with self.usersLock:
+            self.users -= 1
+            unused = self.closing and not self.users
+        if unused:
+            self._close(False)
+
+    def close(self, cancel: bool = True):
+        """Stops taking work. Unless cancel is True, jobs that acquired it keep using it until they release it."""
+        with self.usersLock:
+            self.closing = True
+            unused = not self.users
+        if cancel or unused:
+            self._close(cancel)
+
+    def _close(self, cancel: bool):
+        # Media downloads still running finish, their connections are closed once returned.
+        self.pool.shutdown(wait=False, cancel_futures=cancel)
+        self.session.close()
+        logging.debug("Closed download session")
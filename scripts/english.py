@@ -5,12 +5,16 @@ windowTitle = "Offline Milovana Explorer v%.1f"
 openTease = "Open in Browser"
 copyTeaseUrl = "Copy Tease URL"
 openTeaseFolder = "Open Tease Folder"
+updateTease = "Update Tease"
 importTease = "Import from\nEOSOfflineTemplate"
+importingTeases = "Importing teases..."
 deleteTease = "Delete Tease"
 
 globalSettings = "Global Settings"
 ipTextBoxHint = "Bind to IP"
 portTextBoxHint = "Bind to Port"
+workersTextBoxHint = "HTTP Worker Threads"
+connectionsTextBoxHint = "Download Connections per Host"
 changeIcon = "Change icon..."
 fileSelectIcon = "Select the new icon"
 
@@ -23,11 +27,29 @@ debugMode = "Enable Debug Mode (allows page-skipping)"
 
 downloadTease = "Download Tease"
 downloadButton = "Download"
-downloadInfo = "Enter the milovana URL's numeric ID and press Download."
+teaseIdsTextBoxHint = "Tease IDs"
+downloadPriority = "Priority"
+downloadInfo = "Enter the milovana URL's numeric IDs (e.g. 123, 456 1000-1005) and press Download."
+downloadAdded = "Added %d teases to the queue."
+downloadJob = "%s (priority %d): %s"
+downloadPause = "Pause"
+downloadResume = "Resume"
+downloadRaisePriority = "Raise Priority"
+downloadRemove = "Remove"
+downloadClearFinished = "Clear Finished"
+downloadPauseAll = "Pause all downloads"
+downloadQueued = "Queued"
+downloadPaused = "Paused"
+downloadPausing = "Pausing..."
 downloadComplete = "Download complete."
+downloadUpdated = "Updated: %d downloaded, %d already present, %d failed."
+downloadMediaFailed = "%d media failed to download. Resume to retry them."
+downloadFailed = "Download failed. Resume to retry."
+downloadTeaseMissing = "The tease was deleted, so it can't be updated."
 downloadingMeta = "Downloading metadata..."
 downloadingScript = "Downloading eosscript.json..."
 downloadingMedia = "Downloading media..."
+downloadingMediaProgress = "Downloading media... %d/%d"
 downloadingHtml = "Downloading HTML..."
 
 downloadInvalidId = "Invalid Tease ID."
@@ -38,3 +60,5 @@ downloadUnknownError = "An unexpected error occurred. (check logs)"
 
 fileSelectTease = "Choose the folder that contains the tease"
 saveSettings = "Save Settings"
+loadingTease = "Loading..."
+loadingLibrary = "Loading library..."
@@ -1,19 +1,203 @@
+import concurrent.futures
 import datetime
 import email.utils
 import io
-import json
 import logging
 import os
+import re
+import socket
+import stat
+import threading
+import time
+import typing
 import urllib.parse
 
 from http import HTTPStatus
-from http.server import SimpleHTTPRequestHandler
+from http.server import HTTPServer, SimpleHTTPRequestHandler
 import uuid
 
+from compressionCache import CompressionCache
+from constants import COMPRESSION_CACHE_DIR, HTTP_WORKERS, IMMUTABLE_PATHS, PARTIAL_SUFFIX
+
+# More ranges than this in one request are treated as abuse and ignored.
+MAX_BYTE_RANGES = 16
+
+def parseByteRanges(header: str, size: int) -> list[tuple[int, int]] | None:
+    """Parses a Range header into sorted, coalesced (first, last) byte positions.
+
+    Returns None if the header should be ignored and an empty
+    list if none of the requested ranges can be satisfied.
+    """
+    unit, sep, spec = header.partition("=")
+    if not sep or unit.strip().lower() != "bytes" or size == 0:
+        return None
+    ranges: list[tuple[int, int]] = list()
+    for part in spec.split(","):
+        if not (part := part.strip()):
+            continue
+        first, sep, last = part.partition("-")
+        if not sep or not (first.isdigit() or first == "") or not (last.isdigit() or last == ""):
+            return None
+        if first == "":
+            # Suffix range: the last N bytes
+            if last == "":
+                return None
+            if (suffix := int(last)) > 0:
+                ranges.append((max(0, size - suffix), size - 1))
+            continue
+        first = int(first)
+        if last and int(last) < first:
+            return None
+        if first < size:
+            ranges.append((first, min(int(last), size - 1) if last else size - 1))
+    if len(ranges) > MAX_BYTE_RANGES:
+        return None
+
+    ranges.sort()
+    coalesced: list[tuple[int, int]] = list()
+    for first, last in ranges:
+        if coalesced and first <= coalesced[-1][1] + 1:
+            coalesced[-1] = (coalesced[-1][0], max(last, coalesced[-1][1]))
+        else:
+            coalesced.append((first, last))
+    return coalesced
+
+class RouteTable:
+    """Caches the directory listings that translate_path routes on.
+
+    A listing is only revalidated against its directory's mtime once every
+    ``ttl`` seconds, so resolving a path is normally a few dict lookups.
+    Anything that moves teases around on disk bumps the parent directory's
+    mtime, which drops the stale listing on the next revalidation. Only
+    directories are cached, so paths made up by clients can't grow it.
+    """
+    ttl = 2.0
+
+    def __init__(self):
+        # path -> (last checked, mtime, entries)
+        self._listings: dict[str, tuple[float, int, frozenset[str]]] = dict()
+        self._lock = threading.Lock()
+
+    def listdir(self, path) -> frozenset[str] | None:
+        now = time.monotonic()
+        if (cached := self._listings.get(path)) is not None and now - cached[0] < self.ttl:
+            return cached[2]
+        with self._lock:
+            try:
+                st = os.stat(path)
+                if not stat.S_ISDIR(st.st_mode):
+                    entries = None
+                elif cached is not None and cached[1] == st.st_mtime_ns:
+                    entries = cached[2]
+                else:
+                    logging.debug(f"Rebuilding route listing for {path}")
+                    entries = frozenset(os.listdir(path))
+            except OSError:
+                entries = None
+            if entries is None:
+                self._listings.pop(path, None)
+            else:
+                self._listings[path] = (now, st.st_mtime_ns, entries)
+        return entries
+
+    def hasIndexPage(self, path, indexPages) -> bool | None:
+        """None if path is not a directory, otherwise whether it has its own index page."""
+        if (entries := self.listdir(path)) is None:
+            return None
+        return not entries.isdisjoint(indexPages)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._listings.clear()
+            else:
+                self._listings.pop(path, None)
+
+class MiloHTTPServer(HTTPServer):
+    """HTTPServer that hands each request to a bounded pool of worker threads.
+
+    socketserver.ThreadingMixIn would spawn one thread per connection,
+    which is unbounded when a browser opens dozens of asset requests.
+    Connections that arrive while every worker is busy wait in the pool's
+    queue instead of blocking the accept loop. server_close doesn't wait
+    for responses in flight, it cuts their connections instead.
+    """
+
+    def __init__(self, *args, workers: int = HTTP_WORKERS,
+                 immutablePaths: typing.Iterable[str] = IMMUTABLE_PATHS, **kwargs):
+        self.workers = max(1, workers)
+        # URL paths matching any of these are content-addressed and cached forever.
+        patterns = list()
+        for pattern in immutablePaths:
+            if not pattern:
+                continue
+            try:
+                re.compile(f"(?:{pattern})")
+            except re.error as e:
+                # A typo in config.ini shouldn't keep the server from starting.
+                logging.error(f"Ignoring invalid immutable path pattern {pattern!r}: {e}")
+                continue
+            patterns.append(pattern)
+        self.immutablePaths = re.compile("|".join(f"(?:{pattern})" for pattern in patterns)) if patterns else None
+        self.routeTable = RouteTable()
+        self.compressionCache = CompressionCache(COMPRESSION_CACHE_DIR)
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="MiloHTTP")
+        # Sockets of requests that weren't shut down yet
+        self._requests: set[socket.socket] = set()
+        self._requestsLock = threading.Lock()
+        self._closing = False
+        try:
+            super().__init__(*args, **kwargs)
+        except:
+            self._pool.shutdown(wait=False)
+            raise
+
+    def process_request(self, request, client_address):
+        with self._requestsLock:
+            self._requests.add(request)
+        future = self._pool.submit(self.process_request_thread, request, client_address)
+        # Requests that never got a worker still need their socket closed.
+        future.add_done_callback(
+            lambda f: f.cancelled() and self.shutdown_request(request))
+
+    # Copied from socketserver.ThreadingMixIn
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            # Connections cut by server_close fail on purpose.
+            if not self._closing:
+                self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def shutdown_request(self, request):
+        with self._requestsLock:
+            self._requests.discard(request)
+        super().shutdown_request(request)
+
+    def server_close(self):
+        self._closing = True
+        super().server_close()
+        # This runs on the GUI thread, so it must not wait for a large file to
+        # finish streaming. Queued requests are dropped and the connections of
+        # those in flight are shut down, which makes their workers return.
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.compressionCache.close()
+        with self._requestsLock:
+            requests = list(self._requests)
+        for request in requests:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
 class MiloHTTPRequestHandler(SimpleHTTPRequestHandler):
     server_version = "MiloHTTP/0.6"
     # Copied from http.server.SimpleHTTPRequestHandler
     index_pages = ("index.html", "index.htm")
+    IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
     def __init__(self, *args, directory=None, commonDir=None, appWindow, **kwargs):
         self.commonDir = commonDir
@@ -47,34 +231,44 @@ class MiloHTTPRequestHandler(SimpleHTTPRequestHandler):
         # Some fonts call an absolute path (/static/media/[...])
         # instead of a relative path (../../[...]).
         # This test also includes navy.70005832.png but it's fine.
+        routes: RouteTable = self.server.routeTable
         if path.startswith((sm := os.path.join("static", "media")), i) and \
-              path[i+len(sm)+1:] in os.listdir(os.path.join(self.commonDir, sm)):
+              path[i+len(sm)+1:] in (routes.listdir(os.path.join(self.commonDir, sm)) or ()):
             logging.debug(f"Font workaround: Returning {os.path.join(self.commonDir, path[i:])}")
             return os.path.join(self.commonDir, path[i:])
         
         # Skip a UUID or fail
+        # If accessing the base dir of the tease, it'll be a
+        # forward slash even on windows (blame Apache lmao)
+        nextSep = path.find(os.path.sep, i)
+        if -1 < (pf := path.find("/", i)) < nextSep or nextSep == -1:
+            nextSep = pf
+        if nextSep == -1:
+            nextSep = len(path)
         try:
-            # If accessing the base dir of the tease, it'll be a
-            # forward slash even on windows (blame Apache lmao)
-            nextSep = path.find(os.path.sep, i)
-            if -1 < (pf := path.find("/", i)) < nextSep or nextSep == -1:
-                nextSep = pf
-            if nextSep == -1:
-                raise ValueError
             uuid.UUID(path[i:nextSep])
-            # Skip the last slash too.
-            i = nextSep + 1
         except ValueError:
+            # Not a tease, e.g. the trash or the media store
+            return None
+        # Unloaded teases, e.g. ones being deleted, are gone right away.
+        if path[:nextSep] not in self.appWindow.teases:
+            logging.debug(f"{path[:nextSep]} is not a loaded tease")
+            return None
+        if nextSep == len(path):
+            # The tease folder without a slash, which send_head redirects.
             return path
+        # Skip the last slash too.
+        i = nextSep + 1
         
         # TODO make this more precise, maybe..?
-        if i == len(path) and os.path.isdir(path) and \
-              not set(self.index_pages).intersection(os.listdir(path)):
+        if i == len(path) and routes.hasIndexPage(path, self.index_pages) is False:
             # Normally we would serve "index.html" by default if the
             # path was the folder, but it was moved to commonfiles.
             logging.debug(f"Returning eos index.html for {path}")
             return os.path.join(self.commonDir, "index.html")
-        if path.startswith(tuple(os.listdir(self.commonDir)), i):
+        # First path component below the tease, e.g. "static" or "eos.html"
+        head = path[i:].replace("/", os.path.sep).split(os.path.sep, 1)[0]
+        if head in (routes.listdir(self.commonDir) or ()):
             logging.debug(f"New path is {os.path.join(self.commonDir, path[i:])}")
             return os.path.join(self.commonDir, path[i:])
             
@@ -92,8 +286,14 @@ class MiloHTTPRequestHandler(SimpleHTTPRequestHandler):
         None, in which case the caller has nothing further to do.
 
         """
-        path = self.translate_path(self.path)
+        if (path := self.translate_path(self.path)) is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
         f = None
+        # (part header, offset, length) for each range of a 206 response
+        self.byteRanges: list[tuple[bytes, int, int]] | None = None
+        self.byteRangesEpilogue = b""
+        self.varyOnEncoding = False
         if os.path.isdir(path):
             parts = urllib.parse.urlsplit(self.path)
             if not parts.path.endswith('/'):
@@ -119,70 +319,199 @@ class MiloHTTPRequestHandler(SimpleHTTPRequestHandler):
         # However, some OS platforms accept a trailingSlash as a filename
         # See discussion on python-dev and Issue34711 regarding
         # parsing and rejection of filenames with a trailing slash
-        if path.endswith("/"):
+        # Files that are still being downloaded aren't served either.
+        if path.endswith(("/", PARTIAL_SUFFIX)):
             self.send_error(HTTPStatus.NOT_FOUND, "File not found")
             return None
+        cacheControl = self.getCacheControl(path)
+        compression: CompressionCache = self.server.compressionCache
+        # Body for responses that aren't the file at path
+        data = None
+        mtime = None
         try:
             # Here's the extra part that wasn't in the original
             if path.endswith(f"{os.path.sep}eosscript.json"):
                 if (teaseKey := path.removesuffix(f"{os.path.sep}eosscript.json")) in self.appWindow.teases:
-                    logging.debug(f"Serving in-memory eosscript for {path}")
-                    eosscript = json.dumps(self.appWindow.teases[teaseKey].eosscript).encode()
-                    f = io.BytesIO(eosscript)
-
-                    # Copied from below
-                    self.send_response(HTTPStatus.OK)
-                    self.send_header("Content-type", ctype)
-                    self.send_header("Content-Length", len(eosscript))
-                    # Make sure this copy is never cached.
-                    self.send_header("Last-Modified",
-                        self.date_time_string(int(datetime.datetime.utcnow().timestamp())))
-                    self.end_headers()
-                    return f
+                    if (served := self.appWindow.teases[teaseKey].getServedEosscript()) is not None:
+                        logging.debug(f"Serving in-memory eosscript for {path}")
+                        data, etag = served
+                        size = len(data)
+                    else:
+                        logging.debug(f"Serving unmodified eosscript from disk for {path}")
                 else:
                     logging.debug(f"{teaseKey} was not in {self.appWindow.teases=} or has no eosscript.")
-            f = open(path, 'rb')
+            if data is None:
+                f = open(path, 'rb')
         except OSError:
             self.send_error(HTTPStatus.NOT_FOUND, "File not found")
             return None
 
         try:
-            fs = os.fstat(f.fileno())
-            # Use browser cache if possible
-            if ("If-Modified-Since" in self.headers
-                    and "If-None-Match" not in self.headers):
-                # compare If-Modified-Since and time of last file modification
-                try:
-                    ims = email.utils.parsedate_to_datetime(
-                        self.headers["If-Modified-Since"])
-                except (TypeError, IndexError, OverflowError, ValueError):
-                    # ignore ill-formed values
-                    pass
+            if f is not None:
+                fs = os.fstat(f.fileno())
+                etag = self.fileETag(fs)
+                mtime = fs.st_mtime
+                size = fs.st_size
+
+            encoding = None
+            self.varyOnEncoding = compression.isCompressible(ctype, size)
+            if self.varyOnEncoding and \
+                  (encoding := compression.chooseEncoding(self.headers["Accept-Encoding"])) is not None:
+                if (variant := compression.getVariant(path, etag, encoding, data)) is not None:
+                    if f is not None:
+                        f.close()
+                    f = open(variant, 'rb')
+                    etag = compression.variantETag(etag, encoding)
+                    size = os.fstat(f.fileno()).st_size
                 else:
-                    if ims.tzinfo is None:
-                        # obsolete format with no timezone, cf.
-                        # https://tools.ietf.org/html/rfc7231#section-7.1.1.1
-                        ims = ims.replace(tzinfo=datetime.timezone.utc)
-                    if ims.tzinfo is datetime.timezone.utc:
-                        # compare to UTC datetime of last modification
-                        last_modif = datetime.datetime.fromtimestamp(
-                            fs.st_mtime, datetime.timezone.utc)
-                        # remove microseconds, like in If-Modified-Since
-                        last_modif = last_modif.replace(microsecond=0)
-
-                        if last_modif <= ims:
-                            self.send_response(HTTPStatus.NOT_MODIFIED)
-                            self.end_headers()
-                            f.close()
-                            return None
-
-            self.send_response(HTTPStatus.OK)
-            self.send_header("Content-type", ctype)
-            self.send_header("Content-Length", str(fs[6]))
-            self.send_header("Last-Modified",
-                self.date_time_string(fs.st_mtime))
+                    encoding = None
+            if f is None:
+                f = io.BytesIO(data)
+
+            # Use browser cache if possible
+            if self.isNotModified(etag, mtime):
+                self.sendNotModified(etag, cacheControl)
+                f.close()
+                return None
+
+            ranges = self.getRequestedRanges(etag, size, mtime)
+            if ranges == []:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                f.close()
+                return None
+
+            if ranges is None:
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-type", ctype)
+                self.send_header("Content-Length", str(size))
+            elif len(ranges) == 1:
+                first, last = ranges[0]
+                self.byteRanges = [(b"", first, last - first + 1)]
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-type", ctype)
+                self.send_header("Content-Range", f"bytes {first}-{last}/{size}")
+                self.send_header("Content-Length", str(last - first + 1))
+            else:
+                boundary = uuid.uuid4().hex
+                self.byteRanges = [(
+                    (f"\r\n--{boundary}\r\n"
+                     f"Content-Type: {ctype}\r\n"
+                     f"Content-Range: bytes {first}-{last}/{size}\r\n\r\n").encode("latin-1"),
+                    first, last - first + 1
+                ) for first, last in ranges]
+                self.byteRangesEpilogue = f"\r\n--{boundary}--\r\n".encode("latin-1")
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-type", f"multipart/byteranges; boundary={boundary}")
+                self.send_header("Content-Length", str(
+                    sum(len(header) + length for header, _, length in self.byteRanges)
+                    + len(self.byteRangesEpilogue)))
+            if encoding is not None:
+                self.send_header("Content-Encoding", encoding)
+            if self.varyOnEncoding:
+                self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Accept-Ranges", "bytes")
+            if mtime is not None:
+                self.send_header("Last-Modified",
+                    self.date_time_string(mtime))
+            self.send_header("ETag", etag)
+            if cacheControl is not None:
+                self.send_header("Cache-Control", cacheControl)
             self.end_headers()
             return f
         except:
-            f.close()
+            if f is not None:
+                f.close()
             raise
+
+    def getRequestedRanges(self, etag: str, size: int, mtime: float | None) -> list[tuple[int, int]] | None:
+        """Returns the byte ranges to send, None for the whole file
+        or an empty list if the Range header is unsatisfiable."""
+        if "Range" not in self.headers or self.command != "GET":
+            return None
+        if (ifRange := self.headers["If-Range"]) is not None:
+            ifRange = ifRange.strip()
+            if ifRange.startswith(("\"", "W/")):
+                # If-Range uses the strong comparison function.
+                if ifRange != etag:
+                    return None
+            elif mtime is None or ifRange != self.date_time_string(mtime):
+                return None
+        return parseByteRanges(self.headers["Range"], size)
+
+    def copyfile(self, source, outputfile):
+        """Sends the body with sendfile(2) where possible.
+
+        socket.sendfile falls back to plain send() by itself when the
+        platform or the source file object doesn't support it.
+        """
+        if outputfile is not self.wfile:
+            return super().copyfile(source, outputfile)
+        self.wfile.flush()
+        if self.byteRanges is None:
+            self.connection.sendfile(source)
+            return
+        for header, offset, length in self.byteRanges:
+            if header:
+                self.wfile.write(header)
+            self.connection.sendfile(source, offset, length)
+        if self.byteRangesEpilogue:
+            self.wfile.write(self.byteRangesEpilogue)
+
+    def getCacheControl(self, path) -> str | None:
+        # eosscript.json and config.ini are fetched on every page open
+        # and change when the tease settings are saved, so make the
+        # browser revalidate them instead of guessing a freshness lifetime.
+        if path.endswith((f"{os.path.sep}eosscript.json", f"{os.path.sep}config.ini")):
+            return "no-cache"
+        # Content-hashed files never change under the same name.
+        urlPath = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        if (immutablePaths := self.server.immutablePaths) is not None and immutablePaths.search(urlPath):
+            return self.IMMUTABLE_CACHE_CONTROL
+        return None
+
+    @staticmethod
+    def fileETag(fs: os.stat_result) -> str:
+        # Same scheme as nginx: changes whenever the file is rewritten.
+        return f'"{fs.st_mtime_ns:x}-{fs.st_size:x}"'
+
+    def isNotModified(self, etag: str, mtime: float | None = None) -> bool:
+        """Checks the request's conditional headers against the current representation."""
+        if "If-None-Match" in self.headers:
+            # If-None-Match uses the weak comparison function.
+            candidates = [tag.strip().removeprefix("W/") for tag in self.headers["If-None-Match"].split(",")]
+            return "*" in candidates or etag.removeprefix("W/") in candidates
+
+        # Copied from http.server.SimpleHTTPRequestHandler.send_head
+        if "If-Modified-Since" in self.headers and mtime is not None:
+            # compare If-Modified-Since and time of last file modification
+            try:
+                ims = email.utils.parsedate_to_datetime(
+                    self.headers["If-Modified-Since"])
+            except (TypeError, IndexError, OverflowError, ValueError):
+                # ignore ill-formed values
+                pass
+            else:
+                if ims.tzinfo is None:
+                    # obsolete format with no timezone, cf.
+                    # https://tools.ietf.org/html/rfc7231#section-7.1.1.1
+                    ims = ims.replace(tzinfo=datetime.timezone.utc)
+                if ims.tzinfo is datetime.timezone.utc:
+                    # compare to UTC datetime of last modification
+                    last_modif = datetime.datetime.fromtimestamp(
+                        mtime, datetime.timezone.utc)
+                    # remove microseconds, like in If-Modified-Since
+                    last_modif = last_modif.replace(microsecond=0)
+                    return last_modif <= ims
+        return False
+
+    def sendNotModified(self, etag: str, cacheControl: str | None = None):
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header("ETag", etag)
+        if self.varyOnEncoding:
+            self.send_header("Vary", "Accept-Encoding")
+        if cacheControl is not None:
+            self.send_header("Cache-Control", cacheControl)
+        self.end_headers()
@@ -0,0 +1,68 @@
+import json
+import typing
+
+# Rule action that deletes the key instead of replacing its value
+REMOVE = object()
+
+class EosTransform:
+    """A set of eosscript rewrites, compiled once and applied in one pass.
+
+    Rules map a path of keys such as "nyx.timer/style" to REMOVE or to a
+    replacement value. A path matches wherever its first key appears in a
+    dict of the eosscript, at any depth. loads applies the rules while the
+    JSON is being decoded, apply does the same to an already parsed
+    eosscript.
+    """
+
+    def __init__(self, name: str, rules: dict[str, typing.Any]):
+        # Used as the cache variant of what this transform produces
+        self.name = name
+        # key -> (action or None, child rules)
+        self.rules: dict[str, tuple[typing.Any, dict]] = dict()
+        for path, action in rules.items():
+            node = self.rules
+            *parents, leaf = path.split("/")
+            for key in parents:
+                node = node.setdefault(key, (None, dict()))[1]
+            node[leaf] = (action, node.get(leaf, (None, dict()))[1])
+
+    def loads(self, text: str | bytes) -> typing.Any:
+        return json.loads(text, object_hook=self.rewrite)
+
+    def apply(self, eosscript: typing.Any) -> typing.Any:
+        """Rewrites eosscript in place and returns it."""
+        stack = [eosscript]
+        while stack:
+            eosFrag = stack.pop()
+            if isinstance(eosFrag, dict):
+                self.rewrite(eosFrag)
+                stack.extend(eosFrag.values())
+            elif isinstance(eosFrag, list):
+                stack.extend(eosFrag)
+        return eosscript
+
+    def rewrite(self, eosFrag: dict) -> dict:
+        """Applies the rules rooted at eosFrag, but not those of the dicts inside it."""
+        for key, rule in self.rules.items():
+            if key in eosFrag:
+                self._rewriteKey(eosFrag, key, rule)
+        return eosFrag
+
+    @classmethod
+    def _rewriteKey(cls, eosFrag: dict, key: str, rule: tuple[typing.Any, dict]):
+        action, children = rule
+        if action is REMOVE:
+            del eosFrag[key]
+            return
+        if action is not None:
+            eosFrag[key] = action
+        if children and isinstance(value := eosFrag[key], dict):
+            for childKey, childRule in children.items():
+                if childKey in value:
+                    cls._rewriteKey(value, childKey, childRule)
+
+# The EOS player shows hidden and secret timers once their style is gone.
+UNHIDE_TIMERS = EosTransform("unhide_timers", {
+    "timer/style": REMOVE,
+    "nyx.timer/style": REMOVE
+})
@@ -0,0 +1,63 @@
+import collections
+import logging
+import os
+import threading
+import typing
+
+class EosscriptCache:
+    """Encoded eosscripts of recently opened teases, bounded by their total size.
+
+    Only the bytes sent to the browser are kept, never the parsed JSON.
+    Entries are tied to the (mtime, size) of eosscript.json and a variant
+    naming how it was transformed, so a changed file or setting is simply
+    loaded again. The least recently used entries are evicted first.
+    """
+
+    def __init__(self, maxBytes: int):
+        self.maxBytes = maxBytes
+        # rootDir -> (file signature, variant, encoded bytes, ETag), oldest first
+        self.entries: collections.OrderedDict[str, tuple[tuple[int, int], typing.Any, bytes, str]] = \
+            collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, rootDir: os.PathLike, variant: typing.Any,
+            load: typing.Callable[[], tuple[bytes, str]]) -> tuple[bytes, str]:
+        """Returns the encoded eosscript and ETag of rootDir, calling load on a miss."""
+        st = os.stat(os.path.join(rootDir, "eosscript.json"))
+        signature = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            if (entry := self.entries.get(rootDir)) is not None and entry[:2] == (signature, variant):
+                self.entries.move_to_end(rootDir)
+                self.hits += 1
+                return entry[2:]
+            self.misses += 1
+        encoded, etag = load()
+        with self.lock:
+            self._discard(rootDir)
+            if len(encoded) <= self.maxBytes:
+                self.entries[rootDir] = (signature, variant, encoded, etag)
+                self.size += len(encoded)
+                while self.size > self.maxBytes:
+                    evicted, entry = self.entries.popitem(last=False)
+                    self.size -= len(entry[2])
+                    logging.debug(f"Evicted eosscript of {evicted}")
+            logging.debug(f"Eosscript cache: {self.getUsage()}")
+        return encoded, etag
+
+    def discard(self, rootDir: os.PathLike):
+        with self.lock:
+            self._discard(rootDir)
+
+    def _discard(self, rootDir: os.PathLike):
+        if (entry := self.entries.pop(rootDir, None)) is not None:
+            self.size -= len(entry[2])
+
+    def getUsage(self) -> str:
+        return f"{len(self.entries)} eosscripts in {self.size // 1024}/{self.maxBytes // 1024} KiB, " \
+               f"{self.hits} hits, {self.misses} misses"
@@ -0,0 +1,211 @@
+# Full-text index over the pages of every tease. The extraction half runs in
+# worker processes, so it must not import Qt and must return picklable data.
+import bisect
+import collections
+import html
+import json
+import logging
+import math
+import os
+import re
+import typing
+
+from htmlParser import parseHtml
+
+# Keys of eosscript page actions that hold text shown to the user
+EOS_TEXT_KEYS = ("label", "text")
+TOKEN_RE = re.compile(r"\w+")
+TAG_RE = re.compile(r"<[^>]*>")
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def stripTags(text: str) -> str:
+    return html.unescape(TAG_RE.sub(" ", text))
+
+def getContentSignature(rootDir: os.PathLike) -> list[list]:
+    """[name, mtime, size] of every file the text of rootDir comes from."""
+    signature = list()
+    with os.scandir(rootDir) as entries:
+        for entry in entries:
+            if entry.is_file() and (entry.name == "eosscript.json" or entry.name.endswith(".html")):
+                st = entry.stat()
+                signature.append([entry.name, st.st_mtime_ns, st.st_size])
+    signature.sort()
+    return signature
+
+def indexTeaseText(rootDir: os.PathLike, signature: list | None = None) -> dict | None:
+    """Returns the index document for rootDir, or None if signature is still current."""
+    if (current := getContentSignature(rootDir)) == signature:
+        return None
+    terms = collections.Counter()
+    for name, _, _ in current:
+        path = os.path.join(rootDir, name)
+        texts = getEosText(path) if name == "eosscript.json" else getHtmlText(path)
+        for text in texts:
+            terms.update(tokenize(text))
+    return {
+        "rootDir": rootDir,
+        "signature": current,
+        "length": sum(terms.values()),
+        "terms": dict(terms)
+    }
+
+def getEosText(path: os.PathLike) -> typing.Iterator[str]:
+    with open(path) as f:
+        eosscript = json.load(f)
+    stack = [eosscript.get("pages", {})]
+    while stack:
+        eosFrag = stack.pop()
+        if isinstance(eosFrag, dict):
+            for key, value in eosFrag.items():
+                if key in EOS_TEXT_KEYS and isinstance(value, str):
+                    yield stripTags(value)
+                else:
+                    stack.append(value)
+        elif isinstance(eosFrag, list):
+            stack.extend(eosFrag)
+
+def getHtmlText(path: os.PathLike) -> typing.Iterator[str]:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        htmlTree = parseHtml(f)
+    for tag in htmlTree.find_all(("script", "style")):
+        tag.decompose()
+    yield htmlTree.get_text(" ")
+
+class FullTextIndex:
+    """On-disk inverted index of the words in every tease, ranked with BM25.
+
+    Documents come from indexTeaseText and are kept until their content
+    signature changes. Query words match every indexed word they are a
+    prefix of, so results show up while a word is still being typed.
+    Words shorter than MIN_PREFIX only match themselves, since expanding
+    them would go through most of the vocabulary.
+    """
+    VERSION = 1
+    K1 = 1.2
+    B = 0.75
+    MIN_PREFIX = 3
+
+    def __init__(self, path: os.PathLike):
+        self.path = path
+        # rootDir -> document from indexTeaseText
+        self.documents: dict[str, dict] = dict()
+        # word -> rootDir -> occurrences
+        self.postings: dict[str, dict[str, int]] = dict()
+        self.totalLength = 0
+        # Sorted words for prefix lookups, rebuilt after the postings change
+        self.vocabulary: list[str] | None = None
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                index = json.load(f)
+            if index.get("version") == self.VERSION:
+                for document in index["teases"].values():
+                    self._add(document)
+            else:
+                logging.info(f"Ignoring full-text index {self.path} with version {index.get('version')}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError, TypeError) as e:
+            logging.warning(f"Could not read full-text index {self.path}: {e}")
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmpPath = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmpPath, "w") as f:
+                json.dump({"version": self.VERSION, "teases": self.documents}, f, separators=(",", ":"))
+            os.replace(tmpPath, self.path)
+            self.dirty = False
+            logging.debug(f"Saved full-text index with {len(self.documents)} teases")
+        except OSError as e:
+            logging.warning(f"Could not write full-text index {self.path}: {e}")
+
+    def getSignature(self, rootDir: os.PathLike) -> list | None:
+        if (document := self.documents.get(rootDir)) is not None:
+            return document["signature"]
+        return None
+
+    def update(self, document: dict):
+        self.remove(document["rootDir"])
+        self._add(document)
+        self.dirty = True
+
+    def remove(self, rootDir: os.PathLike):
+        if (document := self.documents.pop(rootDir, None)) is None:
+            return
+        for word in document["terms"]:
+            postings = self.postings[word]
+            del postings[rootDir]
+            if not postings:
+                del self.postings[word]
+                self.vocabulary = None
+        self.totalLength -= document["length"]
+        self.dirty = True
+
+    def prune(self, rootDirs: typing.Iterable[str]):
+        """Forgets every tease that isn't in rootDirs."""
+        for rootDir in self.documents.keys() - set(rootDirs):
+            self.remove(rootDir)
+
+    def _add(self, document: dict):
+        rootDir = document["rootDir"]
+        self.documents[rootDir] = document
+        for word, count in document["terms"].items():
+            if (postings := self.postings.get(word)) is None:
+                postings = self.postings[word] = dict()
+                self.vocabulary = None
+            postings[rootDir] = count
+        self.totalLength += document["length"]
+
+    def expand(self, prefix: str) -> list[str]:
+        """Returns every indexed word starting with prefix."""
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + "\U0010ffff", start)
+        return self.vocabulary[start:end]
+
+    def getWords(self, queryWord: str) -> list[str]:
+        """Returns the indexed words queryWord matches."""
+        if len(queryWord) < self.MIN_PREFIX:
+            return [queryWord] if queryWord in self.postings else []
+        return self.expand(queryWord)
+
+    def match(self, text: str, candidates: typing.Collection[str] | None = None) -> set[str]:
+        """Returns the teases that contain every word of text."""
+        matches = None if candidates is None else set(candidates)
+        for prefix in tokenize(text):
+            wordMatches = set()
+            for word in self.getWords(prefix):
+                wordMatches.update(self.postings[word].keys() if matches is None else
+                                   matches.intersection(self.postings[word]))
+            matches = wordMatches
+            if not matches:
+                break
+        return matches if matches is not None else set()
+
+    def score(self, texts: typing.Iterable[str], rootDirs: typing.Iterable[str]) -> dict[str, float]:
+        """BM25 relevance of rootDirs to the words of texts."""
+        scores = dict.fromkeys(rootDirs, 0.0)
+        if not self.documents:
+            return scores
+        averageLength = max(self.totalLength / len(self.documents), 1)
+        for text in texts:
+            for prefix in tokenize(text):
+                for word in self.getWords(prefix):
+                    postings = self.postings[word]
+                    idf = math.log(1 + (len(self.documents) - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for rootDir in scores.keys() & postings.keys():
+                        count = postings[rootDir]
+                        norm = 1 - self.B + self.B * self.documents[rootDir]["length"] / averageLength
+                        scores[rootDir] += idf * count * (self.K1 + 1) / (count + self.K1 * norm)
+        return scores
@@ -0,0 +1,62 @@
+# BeautifulSoup backend for the saved Milovana pages. This runs in worker
+# processes too, so it must not import Qt.
+import html.parser
+import typing
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml
+    # Faster, but it repairs malformed markup its own way: <p>a<p>b<div>c</div></p>
+    # stays nested with html.parser and becomes three siblings with lxml. So it
+    # is only used for trees that are read, never for pages that are saved.
+    FAST_PARSER = "lxml"
+except ImportError:
+    FAST_PARSER = "html.parser"
+# Saved pages are written back the way this one builds them, whatever is installed.
+SAVE_PARSER = "html.parser"
+
+CHUNK_SIZE = 4 * 1024
+
+def parseHtml(markup: str | bytes | typing.IO) -> BeautifulSoup:
+    """Parses markup with the fastest installed backend, for reading only."""
+    return BeautifulSoup(markup, FAST_PARSER)
+
+def parsePage(markup: str | bytes | typing.IO) -> BeautifulSoup:
+    """Parses a downloaded page for saveHtml, giving the same tree on every install."""
+    return BeautifulSoup(markup, SAVE_PARSER)
+
+class _ImageFinder(html.parser.HTMLParser):
+    def __init__(self, containerId: str, srcPart: str):
+        super().__init__()
+        self.containerId = containerId
+        self.srcPart = srcPart
+        # Open divs inside the container, including itself
+        self.depth = 0
+        self.src: str | None = None
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        if tag == "div":
+            if self.depth:
+                self.depth += 1
+            elif ("id", self.containerId) in attrs:
+                self.depth = 1
+        elif tag == "img" and self.depth and self.src is None:
+            src = dict(attrs).get("src")
+            if src is not None and self.srcPart in src:
+                self.src = src
+
+    def handle_endtag(self, tag: str):
+        if tag == "div" and self.depth:
+            self.depth -= 1
+
+def findImage(f: typing.TextIO, containerId: str, srcPart: str) -> str | None:
+    """src of the first img inside the div with id containerId whose src contains srcPart.
+
+    Tags are matched while f is read, so it stops as soon as the image is
+    found without building a tree of the page.
+    """
+    finder = _ImageFinder(containerId, srcPart)
+    while finder.src is None and (chunk := f.read(CHUNK_SIZE)):
+        finder.feed(chunk)
+    return finder.src
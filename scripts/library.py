@@ -0,0 +1,199 @@
+# Extracts tease metadata from disk. This runs in worker processes at startup,
+# so it must not import Qt and everything it returns must be picklable.
+import json
+import logging
+import os
+import typing
+
+import htmlParser
+
+from constants import PARTIAL_SUFFIX
+
+try:
+    import ijson
+    # Only the C backend beats parsing the whole eosscript with json.load.
+    ijson = ijson.get_backend("yajl2_c")
+except ImportError:
+    ijson = None
+
+# Files whose (mtime, size) decide whether a tease needs to be scanned again
+SIGNATURE_FILES = ("config.ini", "eosscript.json", "index.html", os.path.join("timg", "tb_xl"))
+
+def getTeaseKind(rootDir: os.PathLike) -> str:
+    return "eos" if os.path.isfile(os.path.join(rootDir, "eosscript.json")) else "regular"
+
+def getTeaseSignature(rootDir: os.PathLike) -> list[list[int] | None]:
+    signature = list()
+    for file in SIGNATURE_FILES:
+        try:
+            st = os.stat(os.path.join(rootDir, file))
+        except OSError:
+            signature.append(None)
+        else:
+            # Lists instead of tuples so it compares equal after a JSON round trip
+            signature.append([st.st_mtime_ns, st.st_size])
+    return signature
+
+def listTeases(teasesDir: os.PathLike) -> list[tuple[str, list[list[int] | None]]]:
+    """Returns (rootDir, signature) for every tease folder in teasesDir."""
+    teases = list()
+    with os.scandir(teasesDir) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            rootDir = os.path.join(teasesDir, entry.name)
+            # Folders without a config.ini aren't teases.
+            if (signature := getTeaseSignature(rootDir))[0] is None:
+                continue
+            teases.append((rootDir, signature))
+    return teases
+
+def scanTease(rootDir: os.PathLike) -> dict:
+    """Returns everything a tease card needs to show rootDir."""
+    # Taken first so a change during the scan shows up next time.
+    signature = getTeaseSignature(rootDir)
+    kind = "eos" if signature[SIGNATURE_FILES.index("eosscript.json")] is not None else "regular"
+    with open(os.path.join(rootDir, "config.ini")) as f:
+        config = f.read()
+    if kind == "eos":
+        thumbnail = findEosThumbnail(rootDir)
+    else:
+        thumbnail = findRegularThumbnail(rootDir)
+    return {
+        "rootDir": rootDir,
+        "kind": kind,
+        "config": config,
+        "thumbnail": thumbnail,
+        "signature": signature
+    }
+
+class LibraryIndex:
+    """On-disk cache of scanTease results, keyed on each tease's signature."""
+    VERSION = 1
+
+    def __init__(self, path: os.PathLike):
+        self.path = path
+        self.entries: dict[str, dict] = dict()
+        self.dirty = False
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                index = json.load(f)
+            if index.get("version") == self.VERSION:
+                self.entries = index["teases"]
+            else:
+                logging.info(f"Ignoring library index {self.path} with version {index.get('version')}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logging.warning(f"Could not read library index {self.path}: {e}")
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmpPath = f"{self.path}.tmp"
+        try:
+            with open(tmpPath, "w") as f:
+                json.dump({"version": self.VERSION, "teases": self.entries}, f, separators=(",", ":"))
+            os.replace(tmpPath, self.path)
+            self.dirty = False
+            logging.debug(f"Saved library index with {len(self.entries)} teases")
+        except OSError as e:
+            logging.warning(f"Could not write library index {self.path}: {e}")
+
+    def lookup(self, rootDir: os.PathLike, signature: list) -> dict | None:
+        if (metadata := self.entries.get(rootDir)) is not None and metadata["signature"] == signature:
+            return metadata
+        return None
+
+    def update(self, metadata: dict):
+        self.entries[metadata["rootDir"]] = metadata
+        self.dirty = True
+
+    def remove(self, rootDir: os.PathLike):
+        if self.entries.pop(rootDir, None) is not None:
+            self.dirty = True
+
+    def prune(self, rootDirs: typing.Iterable[str]):
+        """Forgets every tease that isn't in rootDirs."""
+        for rootDir in self.entries.keys() - set(rootDirs):
+            self.remove(rootDir)
+
+def findEosThumbnail(rootDir: os.PathLike) -> str | None:
+    with open(os.path.join(rootDir, "eosscript.json"), "rb") as f:
+        if ijson is not None:
+            imgLocator, imgHash = streamEosThumbnailHash(f)
+        else:
+            eosscript = json.load(f)
+            imgLocator = findFirstImage(eosscript["pages"]["start"])
+            imgHash = None if imgLocator is None else resolveImageLocator(eosscript, imgLocator)
+
+    if imgLocator is None:
+        logging.warning(f"Could not find thumbnail in eosscript for {rootDir}")
+        return None
+    if imgHash is None:
+        logging.warning(f"Unknown image locator: {imgLocator}")
+        return None
+
+    # Downloaded teases name their images exactly after the hash.
+    if os.path.isfile(imgPath := os.path.join(rootDir, "timg", "tb_xl", f"{imgHash}.jpg")):
+        return imgPath
+    for img in os.listdir(imgDir := os.path.join(rootDir, "timg", "tb_xl")):
+        if img.startswith(imgHash) and not img.endswith(PARTIAL_SUFFIX):
+            return os.path.join(imgDir, img)
+
+    logging.warning(f"Could not find thumbnail in media for {rootDir}")
+    return None
+
+def resolveImageLocator(eosscript: dict, imgLocator: str) -> str | None:
+    if imgLocator.startswith("gallery:"):
+        galId, imgId = imgLocator[len("gallery:"):].split("/", 1)
+        for i in eosscript["galleries"][galId]["images"]:
+            # Using str() instead of int() to help prevent errors
+            if str(i["id"]) == imgId or imgId == "*":
+                return i["hash"]
+        logging.warning(f"Could not find {imgLocator} in eosscript galleries")
+    elif imgLocator.startswith("file:"):
+        return eosscript["files"][imgLocator[len("file:"):]]["hash"]
+    return None
+
+def streamEosThumbnailHash(f: typing.BinaryIO) -> tuple[str | None, str | None]:
+    """Returns the locator of the first image on the start page and its hash
+    like findFirstImage and resolveImageLocator, but only the start page and
+    the matching gallery image or file are ever built into objects.
+    """
+    if (startPage := next(ijson.items(f, "pages.start"), None)) is None or \
+          (imgLocator := findFirstImage(startPage)) is None:
+        return None, None
+    f.seek(0)
+    if imgLocator.startswith("gallery:"):
+        galId, imgId = imgLocator[len("gallery:"):].split("/", 1)
+        for i in ijson.items(f, f"galleries.{galId}.images.item"):
+            if str(i["id"]) == imgId or imgId == "*":
+                return imgLocator, i["hash"]
+        logging.warning(f"Could not find {imgLocator} in eosscript galleries")
+    elif imgLocator.startswith("file:"):
+        if (file := next(ijson.items(f, f"files.{imgLocator[len('file:'):]}"), None)) is not None:
+            return imgLocator, file["hash"]
+    return imgLocator, None
+
+def findFirstImage(eosFrag) -> str | None:
+    if isinstance(eosFrag, dict):
+        if "image" in eosFrag:
+            return eosFrag["image"]["locator"]
+        elif "media" in eosFrag and "nyx.image" in eosFrag["media"]:
+            return eosFrag["media"]["nyx.image"]
+        for frag in eosFrag.values():
+            if (res := findFirstImage(frag)) is not None:
+                return res
+    elif isinstance(eosFrag, list):
+        for frag in eosFrag:
+            if (res := findFirstImage(frag)) is not None:
+                return res
+    return None
+
+def findRegularThumbnail(rootDir: os.PathLike) -> str | None:
+    with open(os.path.join(rootDir, "index.html")) as f:
+        src = htmlParser.findImage(f, "cm_wide", "timg/tb_xl")
+    return os.path.join(rootDir, src) if src is not None else None
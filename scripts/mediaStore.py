@@ -0,0 +1,89 @@
+import filecmp
+import logging
+import os
+import shutil
+import typing
+
+from constants import PARTIAL_SUFFIX
+
+# Folders of a tease that hold media named after its content hash
+MEDIA_DIRS = ("timg", os.path.join("timg", "tb_xl"))
+
+class MediaStore:
+    """Media shared by every tease, stored once per content hash.
+
+    Milovana names media after its hash, so the file name is the key.
+    Tease folders get hard links into the store, which keeps them
+    self-contained for the HTTP server while the data exists only once.
+    The link count doubles as the reference count: a stored file whose
+    only link is the store's own isn't used by any tease anymore. Where
+    hard links aren't supported, files are copied instead, which still
+    saves downloading them again.
+    """
+
+    def __init__(self, storeDir: os.PathLike):
+        self.storeDir = storeDir
+
+    def getPath(self, name: str) -> str:
+        return os.path.join(self.storeDir, name[:2], name)
+
+    def link(self, name: str, dest: os.PathLike) -> bool:
+        """Puts the stored copy of name at dest, returning False if there is none."""
+        if not os.path.isfile(storePath := self.getPath(name)):
+            return False
+        try:
+            os.link(storePath, dest)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copyfile(storePath, dest)
+        return True
+
+    def add(self, path: os.PathLike):
+        """Stores the complete media file at path, or links path to an already stored copy."""
+        storePath = self.getPath(os.path.basename(path))
+        try:
+            if os.path.isfile(storePath):
+                # Imported teases don't always name media after its hash, so only
+                # the same content lets the tease's copy be swapped for a link.
+                if os.path.samefile(storePath, path) or not filecmp.cmp(storePath, path, shallow=False):
+                    return
+                tmpPath = f"{path}.tmp"
+                os.link(storePath, tmpPath)
+                os.replace(tmpPath, path)
+            else:
+                os.makedirs(os.path.dirname(storePath), exist_ok=True)
+                os.link(path, storePath)
+        except OSError as e:
+            logging.debug(f"Could not share {path} through the media store: {e}")
+
+    def addTease(self, rootDir: os.PathLike):
+        for name, path in self.listMedia(rootDir):
+            self.add(path)
+
+    def collect(self, names: typing.Iterable[str]):
+        """Deletes the stored copies of names that no tease links to anymore."""
+        freed = 0
+        for name in names:
+            storePath = self.getPath(name)
+            try:
+                if (st := os.stat(storePath)).st_nlink <= 1:
+                    os.remove(storePath)
+                    freed += st.st_size
+            except OSError:
+                pass
+        if freed:
+            logging.info(f"Freed {freed // 1024} KiB of unused media")
+
+    @staticmethod
+    def listMedia(rootDir: os.PathLike) -> list[tuple[str, str]]:
+        """(name, path) of the media files in rootDir."""
+        media = list()
+        for mediaDir in MEDIA_DIRS:
+            try:
+                with os.scandir(os.path.join(rootDir, mediaDir)) as entries:
+                    media.extend((entry.name, entry.path) for entry in entries
+                                 if entry.is_file() and not entry.name.endswith(PARTIAL_SUFFIX))
+            except OSError:
+                pass
+        return media
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import shlex
+import typing
+
+if typing.TYPE_CHECKING:
+    from fullTextIndex import FullTextIndex
+
+class SearchIndex:
+    """Trigram index over the searchable metadata of every tease.
+
+    A query is a list of terms that all have to match. A term is a
+    case-insensitive substring of any field, or of one field if it is
+    written as field:value, e.g. author:foo or id:1234. With a full-text
+    index, terms also match the words on the pages of a tease, and
+    text:value only matches those.
+    """
+    FIELDS = ("title", "author", "tease_id", "author_id")
+    TEXT_FIELD = "text"
+    FIELD_ALIASES = {
+        "title": "title",
+        "author": "author",
+        "id": "tease_id",
+        "tease_id": "tease_id",
+        "authorid": "author_id",
+        "author_id": "author_id",
+        "text": TEXT_FIELD
+    }
+    GRAM = 3
+
+    def __init__(self, fullTextIndex: FullTextIndex | None = None):
+        self.fullTextIndex = fullTextIndex
+        # key -> field -> lowercased value
+        self.documents: dict[str, dict[str, str]] = dict()
+        # field -> trigram -> keys
+        self.grams: dict[str, dict[str, set[str]]] = {field: dict() for field in self.FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, key: str, fields: dict[str, str]):
+        """Indexes key, replacing whatever was indexed for it before."""
+        self.remove(key)
+        document = {field: fields.get(field, "").lower() for field in self.FIELDS}
+        self.documents[key] = document
+        for field, value in document.items():
+            grams = self.grams[field]
+            for gram in self.getGrams(value):
+                grams.setdefault(gram, set()).add(key)
+
+    def remove(self, key: str):
+        if (document := self.documents.pop(key, None)) is None:
+            return
+        for field, value in document.items():
+            grams = self.grams[field]
+            for gram in self.getGrams(value):
+                if (keys := grams.get(gram)) is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del grams[gram]
+
+    def search(self, query: str) -> set[str] | None:
+        """Returns the keys matching every term of query, or None if the query is empty."""
+        terms = self.parseQuery(query)
+        if not terms:
+            return None
+        matches = None
+        # Most selective terms first so the candidate sets shrink quickly
+        for fields, value in sorted(terms, key=lambda term: -len(term[1])):
+            termMatches = set()
+            for field in fields:
+                termMatches |= self.searchField(field, value, matches)
+            matches = termMatches
+            if not matches:
+                break
+        return matches
+
+    def rank(self, query: str, keys: typing.Iterable[str]) -> dict[str, tuple[int, float]]:
+        """Sort keys for keys from search, larger is better.
+
+        Teases whose metadata matches more terms come first, the rest is
+        ordered by how relevant their text is to the query.
+        """
+        terms = self.parseQuery(query)
+        texts = [value for fields, value in terms if self.TEXT_FIELD in fields]
+        if self.fullTextIndex is not None and texts:
+            scores = self.fullTextIndex.score(texts, keys)
+        else:
+            scores = dict.fromkeys(keys, 0.0)
+        ranks = dict()
+        for key, score in scores.items():
+            document = self.documents[key]
+            fieldMatches = sum(any(value in document[field] for field in fields if field != self.TEXT_FIELD)
+                               for fields, value in terms)
+            ranks[key] = (fieldMatches, score)
+        return ranks
+
+    def searchField(self, field: str, value: str, candidates: set[str] | None) -> set[str]:
+        if field == self.TEXT_FIELD:
+            if self.fullTextIndex is None:
+                return set()
+            # Teases that are still being scanned have no metadata yet
+            return self.fullTextIndex.match(value, candidates) & self.documents.keys()
+        if len(value) >= self.GRAM:
+            grams = self.grams[field]
+            for gram in self.getGrams(value):
+                if (keys := grams.get(gram)) is None:
+                    return set()
+                candidates = keys if candidates is None else candidates & keys
+                if not candidates:
+                    return set()
+        elif candidates is None:
+            candidates = self.documents.keys()
+        # Trigrams only prove the pieces are there, not in the right order.
+        return {key for key in candidates if value in self.documents[key][field]}
+
+    @classmethod
+    def parseQuery(cls, query: str) -> list[tuple[tuple[str, ...], str]]:
+        """Splits query into (fields to search, lowercased value) terms."""
+        try:
+            words = shlex.split(query)
+        except ValueError:
+            # Unbalanced quotes
+            words = query.split()
+        terms = list()
+        for word in words:
+            name, sep, value = word.partition(":")
+            if sep and (field := cls.FIELD_ALIASES.get(name.lower())) is not None:
+                fields = (field,)
+            else:
+                fields, value = cls.FIELDS + (cls.TEXT_FIELD,), word
+            if value := value.lower():
+                terms.append((fields, value))
+        return terms
+
+    @classmethod
+    def getGrams(cls, value: str) -> set[str]:
+        return {value[i:i+cls.GRAM] for i in range(len(value) - cls.GRAM + 1)}
@@ -4,10 +4,11 @@ class StoppableThread(threading.Thread):
     # Copied from https://stackoverflow.com/questions/24843193/stopping-a-python-thread-running-an-infinite-loop
     def __init__(self, *args, **kwargs):
         super(StoppableThread, self).__init__(*args, **kwargs)
-        self._stop = threading.Event()
+        # Not _stop, which would shadow the Thread method is_alive and join rely on
+        self._stopEvent = threading.Event()
 
     def stop(self):
-        self._stop.set()
+        self._stopEvent.set()
 
     def stopped(self):
-        return self._stop.is_set()
+        return self._stopEvent.is_set()
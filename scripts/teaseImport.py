@@ -0,0 +1,168 @@
+import collections
+import concurrent.futures
+import logging
+import os
+import shutil
+import threading
+import typing
+
+from PyQt6 import QtCore
+
+from constants import IMPORT_THREADS
+from mediaStore import MediaStore
+from stoppableThread import StoppableThread
+
+try:
+    import fcntl
+    # ioctl from linux/fs.h that makes a file share the blocks of another (btrfs, XFS, ...)
+    FICLONE = 0x40049409
+except ImportError:
+    fcntl = None
+
+# Folders of an EOSOfflineTemplate tease, whose files are never rewritten
+IMPORT_DIRS = ("tease", "timg")
+# Rewritten by the app later, so never hard linked. config.ini goes last
+# because folders without one aren't teases yet.
+IMPORT_FILES = ("eosscript.json", "config.ini")
+
+def reflink(src: os.PathLike, dest: os.PathLike) -> bool:
+    """Clones src to dest without copying its data, if the filesystem can."""
+    if fcntl is None:
+        return False
+    try:
+        with open(src, "rb") as srcFile, open(dest, "wb") as destFile:
+            fcntl.ioctl(destFile.fileno(), FICLONE, srcFile.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(dest)
+        except OSError:
+            pass
+        return False
+
+def transferFile(src: os.PathLike, dest: os.PathLike, link: bool) -> str:
+    """Puts a copy of src at dest as cheaply as possible, returning how."""
+    if reflink(src, dest):
+        return "reflinked"
+    if link:
+        try:
+            os.link(src, dest)
+            return "linked"
+        except OSError:
+            pass
+    # Uses sendfile or the platform's copy call where there is one.
+    shutil.copyfile(src, dest)
+    return "copied"
+
+class TeaseImporter(QtCore.QObject):
+    """Imports EOSOfflineTemplate teases on a background thread.
+
+    Media files are transferred in parallel on a small thread pool, and
+    each one is reflinked or hard linked when the filesystem allows it,
+    so importing from the same disk takes no time or space. Only when
+    neither works are they copied. Each tease is reported through
+    teaseImported once it is complete.
+    """
+    # Files transferred, files found so far, both 0 once every import finished
+    progress = QtCore.pyqtSignal(int, int)
+    # sourceDir, rootDir, whether the tease was imported
+    teaseImported = QtCore.pyqtSignal(str, str, bool)
+
+    def __init__(self, mediaStore: MediaStore | None, parent: QtCore.QObject | None = None):
+        super().__init__(parent)
+        self.mediaStore = mediaStore
+        self.pool = concurrent.futures.ThreadPoolExecutor(IMPORT_THREADS, thread_name_prefix="Import")
+        self.threads: list[StoppableThread] = list()
+        # Imports started and not finished yet
+        self.running = 0
+        self.done = 0
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def start(self, teases: list[tuple[str, str]]):
+        """Imports every (sourceDir, rootDir) of teases, one tease after the other."""
+        with self.lock:
+            if not self.running:
+                self.threads.clear()
+            self.running += 1
+            thread = StoppableThread(target=self.run, args=(teases,), name="Import", daemon=True)
+            self.threads.append(thread)
+        thread.start()
+
+    def isRunning(self) -> bool:
+        with self.lock:
+            return self.running > 0
+
+    def shutdown(self):
+        for thread in self.threads:
+            thread.stop()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, teases: list[tuple[str, str]]):
+        stopped = threading.current_thread().stopped
+        try:
+            for sourceDir, rootDir in teases:
+                if stopped():
+                    break
+                imported = False
+                try:
+                    imported = self.importTease(sourceDir, rootDir, stopped)
+                except Exception:
+                    logging.exception(f"Importing {sourceDir} failed")
+                if not imported:
+                    shutil.rmtree(rootDir, ignore_errors=True)
+                self.teaseImported.emit(sourceDir, rootDir, imported)
+        finally:
+            with self.lock:
+                self.running -= 1
+                if not self.running:
+                    self.done = self.total = 0
+                    self.progress.emit(0, 0)
+
+    def importTease(self, sourceDir: os.PathLike, rootDir: os.PathLike, stopped: typing.Callable[[], bool]) -> bool:
+        media = list()
+        for importDir in IMPORT_DIRS:
+            for dirPath, _, fileNames in os.walk(os.path.join(sourceDir, importDir)):
+                destDir = os.path.join(rootDir, os.path.relpath(dirPath, sourceDir))
+                os.makedirs(destDir, exist_ok=True)
+                media.extend((os.path.join(dirPath, name), os.path.join(destDir, name)) for name in fileNames)
+        files = [(os.path.join(sourceDir, name), os.path.join(rootDir, name))
+                 for name in IMPORT_FILES if os.path.isfile(os.path.join(sourceDir, name))]
+        os.makedirs(rootDir, exist_ok=True)
+        self.addProgress(0, len(media) + len(files))
+
+        methods = collections.Counter()
+        pending = {self.pool.submit(transferFile, src, dest, True) for src, dest in media}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, 1)
+            for future in done:
+                try:
+                    methods[future.result()] += 1
+                except OSError as e:
+                    logging.error(f"Could not import a file of {sourceDir}: {e}")
+                    methods["failed"] += 1
+            self.addProgress(len(done), 0)
+            if stopped():
+                for future in pending:
+                    future.cancel()
+                return False
+
+        if methods["failed"]:
+            # A tease with missing media would be listed as if it were whole.
+            logging.error(f"Importing {sourceDir} failed: {methods['failed']} of {len(media)} media files")
+            return False
+
+        for src, dest in files:
+            methods[transferFile(src, dest, False)] += 1
+            self.addProgress(1, 0)
+        logging.info(f"Imported {sourceDir} to {rootDir}: " +
+                     ", ".join(f"{count} {method}" for method, count in methods.items()))
+        if self.mediaStore is not None:
+            self.mediaStore.addTease(rootDir)
+        return True
+
+    def addProgress(self, done: int, total: int):
+        with self.lock:
+            self.done += done
+            self.total += total
+            self.progress.emit(self.done, self.total)
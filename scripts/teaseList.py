@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import typing
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+from constants import THUMBNAIL_SIZE
+
+if typing.TYPE_CHECKING:
+    from cards import TeaseCard
+
+class TeaseListModel(QtCore.QAbstractListModel):
+    """Every loaded tease card, in the order they were added."""
+    TeaseRole = QtCore.Qt.ItemDataRole.UserRole
+
+    def __init__(self, parent: QtCore.QObject | None = None):
+        super().__init__(parent)
+        self.teases: list[TeaseCard] = list()
+        # rootDir -> row
+        self.rows: dict[str, int] = dict()
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.teases)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> typing.Any:
+        if not index.isValid():
+            return None
+        tease = self.teases[index.row()]
+        if role == self.TeaseRole:
+            return tease
+        elif role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return tease.config["General"]["title"]
+        elif role == QtCore.Qt.ItemDataRole.DecorationRole:
+            return tease.thumbnail
+        elif role == QtCore.Qt.ItemDataRole.ToolTipRole:
+            return tease.rootDir
+        return None
+
+    def flags(self, index: QtCore.QModelIndex) -> QtCore.Qt.ItemFlag:
+        if not index.isValid():
+            return QtCore.Qt.ItemFlag.NoItemFlags
+        # Placeholders can't be selected until their tease has been scanned.
+        if self.teases[index.row()].loaded:
+            return QtCore.Qt.ItemFlag.ItemIsEnabled | QtCore.Qt.ItemFlag.ItemIsSelectable
+        return QtCore.Qt.ItemFlag.ItemIsEnabled
+
+    def addTease(self, tease: TeaseCard):
+        row = len(self.teases)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.teases.append(tease)
+        self.rows[tease.rootDir] = row
+        self.endInsertRows()
+
+    def removeTease(self, tease: TeaseCard):
+        if (row := self.rows.get(tease.rootDir)) is None:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        del self.teases[row]
+        del self.rows[tease.rootDir]
+        for i in range(row, len(self.teases)):
+            self.rows[self.teases[i].rootDir] = i
+        self.endRemoveRows()
+
+    def teaseChanged(self, tease: TeaseCard):
+        if (row := self.rows.get(tease.rootDir)) is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def indexOf(self, tease: TeaseCard) -> QtCore.QModelIndex:
+        if (row := self.rows.get(tease.rootDir)) is None:
+            return QtCore.QModelIndex()
+        return self.index(row)
+
+class TeaseFilterModel(QtCore.QSortFilterProxyModel):
+    """Shows the teases accepted by a predicate, which is applied in one pass when it changes.
+
+    Search results are sorted by a ranking given along with the predicate.
+    """
+
+    def __init__(self, parent: QtCore.QObject | None = None):
+        super().__init__(parent)
+        self.predicate: typing.Callable[[TeaseCard], bool] | None = None
+        # rootDir -> sort key of the accepted teases
+        self.ranking: dict[str, typing.Any] | None = None
+
+    def setPredicate(self, predicate: typing.Callable[[TeaseCard], bool] | None,
+                     ranking: dict[str, typing.Any] | None = None):
+        """Shows the teases accepted by predicate, by descending rank per rootDir if ranking is given.
+
+        ranking needs an entry for every tease predicate accepts.
+        """
+        self.predicate = predicate
+        self.ranking = ranking
+        if ranking is None:
+            # Back to source order before lessThan could be called without a ranking
+            self.sort(-1)
+            self.invalidate()
+        else:
+            self.invalidate()
+            self.sort(0, QtCore.Qt.SortOrder.DescendingOrder)
+
+    def filterAcceptsRow(self, sourceRow: int, sourceParent: QtCore.QModelIndex) -> bool:
+        return self.predicate is None or self.predicate(self.sourceModel().teases[sourceRow])
+
+    def lessThan(self, left: QtCore.QModelIndex, right: QtCore.QModelIndex) -> bool:
+        teases = self.sourceModel().teases
+        return self.ranking[teases[left.row()].rootDir] < self.ranking[teases[right.row()].rootDir]
+
+class TeaseCardDelegate(QtWidgets.QStyledItemDelegate):
+    """Paints a tease card: thumbnail on the left, then title, author and extra info."""
+    MARGIN = 9
+    SPACING = 6
+
+    def __init__(self, parent: QtWidgets.QWidget):
+        super().__init__(parent)
+        self.titleFont = QtGui.QFont(parent.font())
+        self.titleFont.setPointSize(14)
+        self.authorFont = QtGui.QFont(parent.font())
+        self.authorFont.setPointSize(11)
+        self.extraInfoFont = QtGui.QFont(parent.font())
+        self.extraInfoFont.setPointSize(9)
+        self.extraInfoFont.setItalic(True)
+
+    def sizeHint(self, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> QtCore.QSize:
+        return QtCore.QSize(THUMBNAIL_SIZE + 2 * self.MARGIN, THUMBNAIL_SIZE + 2 * self.MARGIN)
+
+    def paint(self, painter: QtGui.QPainter, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex):
+        tease: TeaseCard = index.data(TeaseListModel.TeaseRole)
+        painter.save()
+        textRole = QtGui.QPalette.ColorRole.Text
+        if option.state & QtWidgets.QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.color(QtGui.QPalette.ColorRole.Highlight))
+            textRole = QtGui.QPalette.ColorRole.HighlightedText
+        painter.setPen(option.palette.color(textRole))
+
+        rect = option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        painter.drawPixmap(rect.left(), rect.top(), tease.thumbnail)
+
+        x = rect.left() + THUMBNAIL_SIZE + self.SPACING
+        y = rect.top()
+        for font, text in ((self.titleFont, tease.config["General"]["title"]),
+                           (self.authorFont, tease.config["General"]["author"]),
+                           (self.extraInfoFont, tease.getExtraInfo())):
+            metrics = QtGui.QFontMetrics(font)
+            textRect = QtCore.QRect(x, y, max(0, rect.right() - x), metrics.height())
+            painter.setFont(font)
+            painter.drawText(textRect, QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignVCenter,
+                             metrics.elidedText(text, QtCore.Qt.TextElideMode.ElideRight, textRect.width()))
+            y += metrics.height() + self.SPACING // 2
+        painter.restore()
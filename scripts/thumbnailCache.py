@@ -0,0 +1,116 @@
+import concurrent.futures
+import hashlib
+import logging
+import os
+import threading
+import typing
+
+from PyQt6 import QtCore, QtGui
+
+from constants import THUMBNAIL_SIZE, THUMBNAIL_THREADS
+
+class ThumbnailCache(QtCore.QObject):
+    """Square, scaled-down copies of tease thumbnails, made off the GUI thread.
+
+    Only QImage is used in the worker threads since QPixmap has to stay on
+    the GUI thread. Cached files are named after the source path plus its
+    mtime and size, so edited images are simply redone. prune drops the
+    copies of deleted teases and outdated images.
+    """
+    # rootDir, thumbnail
+    thumbnailReady = QtCore.pyqtSignal(str, QtGui.QImage)
+
+    def __init__(self, cacheDir: os.PathLike, parent: QtCore.QObject | None = None):
+        super().__init__(parent)
+        self.cacheDir = cacheDir
+        self.pool = concurrent.futures.ThreadPoolExecutor(THUMBNAIL_THREADS, thread_name_prefix="Thumbnail")
+
+    def request(self, rootDir: os.PathLike, sourcePath: os.PathLike):
+        """Emits thumbnailReady for rootDir once the thumbnail of sourcePath is available."""
+        self.pool.submit(self._load, rootDir, sourcePath)
+
+    def evict(self, sourcePath: os.PathLike):
+        self.pool.submit(self._removeVariants, self.getPrefix(sourcePath))
+
+    def prune(self, sourcePaths: typing.Iterable[os.PathLike]):
+        """Removes every cached thumbnail that isn't the current one for a path in sourcePaths."""
+        self.pool.submit(self._prune, list(sourcePaths))
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def getPrefix(sourcePath: os.PathLike) -> str:
+        return hashlib.sha1(os.fsencode(os.path.normpath(sourcePath))).hexdigest()[:20]
+
+    def getCachePath(self, sourcePath: os.PathLike, fs: os.stat_result) -> str:
+        version = hashlib.sha1(f"{fs.st_mtime_ns}-{fs.st_size}".encode()).hexdigest()[:8]
+        return os.path.join(self.cacheDir, f"{self.getPrefix(sourcePath)}.{version}.png")
+
+    @staticmethod
+    def cropThumbnail(image: QtGui.QImage) -> QtGui.QImage:
+        # Same as TeaseCard.cropThumbnail, but safe outside the GUI thread.
+        dim = min(image.width(), image.height())
+        if dim == 0:
+            return image
+        return image.copy(
+            (image.width() - dim) // 2,  # top left x
+            (image.height() - dim) // 2,  # top left y
+            dim, dim  # width, height
+        ).scaledToHeight(THUMBNAIL_SIZE, QtCore.Qt.TransformationMode.SmoothTransformation)
+
+    def _load(self, rootDir, sourcePath):
+        try:
+            fs = os.stat(sourcePath)
+        except OSError as e:
+            logging.warning(f"Could not find thumbnail {sourcePath}: {e}")
+            return
+        cachePath = self.getCachePath(sourcePath, fs)
+        if (image := QtGui.QImage(cachePath)).isNull():
+            logging.debug(f"Creating cached thumbnail for {sourcePath}")
+            if (image := self.cropThumbnail(QtGui.QImage(sourcePath))).isNull():
+                logging.warning(f"Could not decode thumbnail {sourcePath}")
+                return
+            tmpPath = f"{cachePath}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(self.cacheDir, exist_ok=True)
+                if not image.save(tmpPath, "PNG"):
+                    raise OSError("QImage.save failed")
+                os.replace(tmpPath, cachePath)
+            except OSError as e:
+                logging.warning(f"Could not write cached thumbnail {cachePath}: {e}")
+        self.thumbnailReady.emit(rootDir, image)
+
+    def _removeVariants(self, prefix: str):
+        try:
+            entries = os.listdir(self.cacheDir)
+        except OSError:
+            return
+        for entry in entries:
+            if entry.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.cacheDir, entry))
+                except OSError:
+                    pass
+
+    def _prune(self, sourcePaths: list[os.PathLike]):
+        live = set()
+        for sourcePath in sourcePaths:
+            try:
+                live.add(os.path.basename(self.getCachePath(sourcePath, os.stat(sourcePath))))
+            except OSError:
+                pass
+        try:
+            entries = os.listdir(self.cacheDir)
+        except OSError:
+            return
+        removed = 0
+        for entry in entries:
+            # Temporary files belong to thumbnails that are still being written.
+            if entry not in live and not entry.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(self.cacheDir, entry))
+                    removed += 1
+                except OSError:
+                    pass
+        logging.debug(f"Pruned {removed} cached thumbnails")
@@ -0,0 +1,53 @@
+import concurrent.futures
+import logging
+import os
+import shutil
+
+from mediaStore import MediaStore
+
+class Trash:
+    """Deletes tease folders without making the caller wait.
+
+    move renames a folder into trashDir, which is atomic as long as both
+    are on the same filesystem, and the data is then removed on a
+    background thread. Folders left behind by a previous run are removed
+    by empty.
+    """
+
+    def __init__(self, trashDir: os.PathLike, mediaStore: MediaStore | None):
+        self.trashDir = trashDir
+        self.mediaStore = mediaStore
+        self.pool = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="Trash")
+
+    def move(self, rootDir: os.PathLike):
+        """Moves rootDir to the trash and deletes it in the background. Raises OSError if it can't be moved."""
+        os.makedirs(self.trashDir, exist_ok=True)
+        trashPath = os.path.join(self.trashDir, os.path.basename(os.path.normpath(rootDir)))
+        os.rename(rootDir, trashPath)
+        self.pool.submit(self._delete, trashPath)
+
+    def empty(self):
+        try:
+            entries = os.listdir(self.trashDir)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logging.warning(f"Could not read trash {self.trashDir}: {e}")
+            return
+        logging.info(f"Deleting {len(entries)} teases left in the trash")
+        for entry in entries:
+            self.pool.submit(self._delete, os.path.join(self.trashDir, entry))
+
+    def shutdown(self):
+        # Whatever is left is deleted by empty on the next start.
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _delete(self, trashPath: os.PathLike):
+        media = MediaStore.listMedia(trashPath)
+        shutil.rmtree(trashPath, ignore_errors=True)
+        if os.path.exists(trashPath):
+            logging.warning(f"Could not delete everything in {trashPath}")
+        else:
+            logging.debug(f"Deleted {trashPath}")
+        if self.mediaStore is not None:
+            self.mediaStore.collect(name for name, _ in media)
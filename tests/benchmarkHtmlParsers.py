@@ -0,0 +1,121 @@
+"""Compares BeautifulSoup's backends on saved Milovana pages.
+
+Usage: python3 tests/benchmarkHtmlParsers.py [teasesDir ...]
+
+Every .html file in the given folders (teases/ by default) is rewritten
+by saveHtml with each installed backend, and the files and links are
+compared with html.parser's, which is what the app saves pages with. The
+words full-text search extracts are compared the same way, and the
+thumbnails of index.html files found by findImage against the tree lookup
+it replaced. A malformed snippet is always added to show how the backends
+can disagree.
+"""
+import collections
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from bs4 import BeautifulSoup
+
+# cards has to be imported before app, which imports it back.
+import cards
+import app
+import fullTextIndex
+import htmlParser
+
+MALFORMED = ("malformed example", "<html><head><title>x</title></head><body><p>a<p>b<div>c</div></p></body></html>")
+
+def findPages(teasesDirs: list[str]) -> list[tuple[str, str]]:
+    pages = list()
+    for teasesDir in teasesDirs:
+        for dirPath, _, fileNames in os.walk(teasesDir):
+            for name in sorted(fileNames):
+                if name.endswith(".html"):
+                    path = os.path.join(dirPath, name)
+                    with open(path, encoding="utf-8", errors="replace") as f:
+                        pages.append((path, f.read()))
+    return pages
+
+def saveWith(parser: str, markup: str, tempDir: str) -> tuple[str, set, set]:
+    path = os.path.join(tempDir, f"{parser}.html")
+    # saveHtml doesn't use the job, only the tree.
+    nextLinks, mediaLinks = app.DownloadJob.saveHtml(None, "", "0", BeautifulSoup(markup, parser), path)
+    with open(path, encoding="utf-8") as f:
+        return f.read(), nextLinks, mediaLinks
+
+def wordsWith(parser: str, markup: str) -> collections.Counter:
+    htmlTree = BeautifulSoup(markup, parser)
+    for tag in htmlTree.find_all(("script", "style")):
+        tag.decompose()
+    return collections.Counter(fullTextIndex.tokenize(htmlTree.get_text(" ")))
+
+def treeThumbnail(markup: str) -> str | None:
+    # The lookup library.findRegularThumbnail did before findImage.
+    htmlTree = BeautifulSoup(markup, "html.parser").find("html", recursive=False)
+    htmlTree = htmlTree and htmlTree.find("body", recursive=False)
+    htmlTree = htmlTree and htmlTree.find("div", {"id": "cm_wide"})
+    for link in htmlTree.find_all("img", src=True) if htmlTree else ():
+        if "timg/tb_xl" in link["src"]:
+            return link["src"]
+    return None
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def main(teasesDirs: list[str]):
+    logging.disable(logging.CRITICAL)
+    pages = findPages(teasesDirs)
+    if not pages:
+        print(f"No saved pages in {', '.join(teasesDirs)}")
+    print(f"{len(pages)} pages, {sum(len(markup) for _, markup in pages) // 1024} KiB")
+    pages.append(MALFORMED)
+
+    parsers = ["html.parser"] + [htmlParser.FAST_PARSER] * (htmlParser.FAST_PARSER != "html.parser")
+    saveTimes = collections.Counter()
+    wordTimes = collections.Counter()
+    saveDiffs = collections.defaultdict(list)
+    wordDiffs = collections.defaultdict(list)
+    with tempfile.TemporaryDirectory() as tempDir:
+        for name, markup in pages:
+            saved = words = None
+            for parser in parsers:
+                parserSaved, seconds = timed(saveWith, parser, markup, tempDir)
+                saveTimes[parser] += seconds
+                parserWords, seconds = timed(wordsWith, parser, markup)
+                wordTimes[parser] += seconds
+                if saved is None:
+                    saved, words = parserSaved, parserWords
+                    continue
+                if parserSaved != saved:
+                    saveDiffs[parser].append(name)
+                if parserWords != words:
+                    wordDiffs[parser].append(name)
+
+    for parser in parsers:
+        print(f"{parser}: saveHtml {saveTimes[parser] / len(pages) * 1000:.1f} ms/page, "
+              f"text {wordTimes[parser] / len(pages) * 1000:.1f} ms/page")
+        for what, diffs in (("saved pages", saveDiffs[parser]), ("page words", wordDiffs[parser])):
+            if diffs:
+                print(f"  {len(diffs)} {what} differ from html.parser's: {', '.join(diffs)}")
+
+    thumbnails = [(name, markup) for name, markup in pages if os.path.basename(name) == "index.html"]
+    if thumbnails:
+        treeSrcs, treeSeconds = timed(lambda: [treeThumbnail(markup) for _, markup in thumbnails])
+        findSrcs, findSeconds = timed(lambda: [htmlParser.findImage(io.StringIO(markup), "cm_wide", "timg/tb_xl")
+                                               for _, markup in thumbnails])
+        print(f"Thumbnails: tree {treeSeconds / len(thumbnails) * 1000:.1f} ms/page, "
+              f"findImage {findSeconds / len(thumbnails) * 1000:.1f} ms/page")
+        for (name, _), treeSrc, findSrc in zip(thumbnails, treeSrcs, findSrcs):
+            if treeSrc != findSrc:
+                print(f"  {name}: {treeSrc} with the tree, {findSrc} with findImage")
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "teases")])
@@ -0,0 +1,18 @@
+import gzip
+import os
+
+from compressionCache import CompressionCache
+
+def test_variantsAreCreatedInTheBackground(tmp_path):
+    cache = CompressionCache(tmp_path / "cache")
+    path = str(tmp_path / "tease" / "eosscript.json")
+    assert cache.getVariant(path, '"1"', "gzip", b"a" * 4096) is None
+    cache.pool.shutdown(wait=True)
+    variant = cache.getVariant(path, '"1"', "gzip", b"a" * 4096)
+    with open(variant, "rb") as f:
+        assert gzip.decompress(f.read()) == b"a" * 4096
+
+    newVariant = cache.createVariant(path, '"2"', "gzip", b"b" * 4096)
+    assert os.listdir(os.path.dirname(newVariant)) == [os.path.basename(newVariant)]
+    cache.discard(os.path.dirname(path))
+    assert not os.path.exists(newVariant)
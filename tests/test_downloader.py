@@ -0,0 +1,64 @@
+from http import HTTPStatus
+
+import pytest
+
+from constants import PARTIAL_SUFFIX
+from downloader import Downloader
+
+BODY = b"0123456789"
+
+class FakeResponse:
+    def __init__(self, statusCode: int, headers: dict, body: bytes = b""):
+        self.status_code = statusCode
+        self.reason = HTTPStatus(statusCode).phrase
+        self.headers = headers
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def iter_content(self, chunkSize: int):
+        yield self.body
+
+# Serves BODY, answering ranges past its end like a server whose file got shorter.
+def serve(url: str, headers: dict | None = None, **kwargs) -> FakeResponse:
+    if headers and "Range" in headers:
+        start = int(headers["Range"][len("bytes="):-1])
+        if start >= len(BODY):
+            return FakeResponse(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, {"Content-Range": f"bytes */{len(BODY)}"})
+        # Starts at 0 no matter what was asked for
+        return FakeResponse(HTTPStatus.PARTIAL_CONTENT, {"Content-Range": f"bytes 0-{len(BODY) - 1}/{len(BODY)}"}, BODY)
+    return FakeResponse(HTTPStatus.OK, {}, BODY)
+
+@pytest.mark.parametrize("partial", [b"0123456789abc", b"01234"])
+def test_unresumablePartialFileIsReplaced(tmp_path, partial: bytes):
+    downloader = Downloader(1, 100)
+    downloader.session.get = serve
+    path = tmp_path / "media.jpg"
+    (tmp_path / f"media.jpg{PARTIAL_SUFFIX}").write_bytes(partial)
+    assert downloader.download("https://example.com/media.jpg", path)
+    assert path.read_bytes() == BODY
+    assert not (tmp_path / f"media.jpg{PARTIAL_SUFFIX}").exists()
+    downloader.close()
+
+def test_replacedDownloaderClosesOnceReleased():
+    old = Downloader(2, 100).acquire()
+    closed = list()
+    old.session.close = lambda: closed.append(True)
+    host = old.getHost("https://example.com/a.jpg")
+    new = Downloader(4, 100, old)
+    old.close(cancel=False)
+
+    assert new.getHost("https://example.com/b.jpg") is host
+    assert host.maxLimit == 4
+    # Still usable by the job that acquired it
+    assert old.submit(lambda: 1).result() == 1
+    assert not closed
+    old.release()
+    assert closed
+    with pytest.raises(RuntimeError):
+        old.submit(lambda: 1)
+    new.close()
@@ -0,0 +1,40 @@
+import functools
+import socket
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler
+
+from eosHttpServer import MiloHTTPServer, RouteTable
+
+def test_closeDoesntWaitForResponses(tmp_path):
+    # Far more than the socket buffers hold, so the response blocks on the client.
+    with open(tmp_path / "large.mp3", "wb") as f:
+        f.truncate(256 * 1024 * 1024)
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(tmp_path))
+    httpd = MiloHTTPServer(("127.0.0.1", 0), handler, workers=2, immutablePaths=())
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    with socket.create_connection(httpd.server_address) as client:
+        client.sendall(b"GET /large.mp3 HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        assert client.recv(1024).startswith(b"HTTP/1.0 200")
+        start = time.monotonic()
+        httpd.shutdown()
+        httpd.server_close()
+        assert time.monotonic() - start < 2
+
+def test_invalidImmutablePathsAreSkipped(tmp_path):
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(tmp_path))
+    httpd = MiloHTTPServer(("127.0.0.1", 0), handler, immutablePaths=("[unclosed", r"^/static/", ""))
+    try:
+        assert httpd.immutablePaths.search("/static/main.js")
+        assert not httpd.immutablePaths.search("/[unclosed")
+    finally:
+        httpd.server_close()
+
+def test_routeTableOnlyCachesDirectories(tmp_path):
+    routes = RouteTable()
+    (tmp_path / "tease").mkdir()
+    (tmp_path / "tease" / "index.html").touch()
+    assert routes.hasIndexPage(str(tmp_path / "tease"), ("index.html",)) is True
+    assert routes.listdir(str(tmp_path / "tease" / "index.html")) is None
+    assert routes.listdir(str(tmp_path / "00000000-made-up")) is None
+    assert list(routes._listings) == [str(tmp_path / "tease")]
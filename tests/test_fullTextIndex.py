@@ -0,0 +1,13 @@
+from fullTextIndex import FullTextIndex
+
+def addTease(index: FullTextIndex, rootDir: str, terms: dict[str, int]):
+    index.update({"rootDir": rootDir, "signature": [], "terms": terms, "length": sum(terms.values())})
+
+def test_shortWordsAreNotExpanded(tmp_path):
+    index = FullTextIndex(tmp_path / "fulltext.json")
+    addTease(index, "a", {"to": 2, "tower": 1})
+    addTease(index, "b", {"tomato": 1, "tower": 3})
+    assert index.match("to") == {"a"}
+    assert index.match("tow") == {"a", "b"}
+    scores = index.score(["to"], ["a", "b"])
+    assert scores["a"] > 0 and scores["b"] == 0
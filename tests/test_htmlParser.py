@@ -0,0 +1,21 @@
+import io
+
+from bs4 import BeautifulSoup
+
+import htmlParser
+
+PAGE = """<html><body>
+<div id="header"><img src="timg/tb_xl/outside.jpg" /></div>
+<div id="cm_wide"><div id="tease_content"><p>a<p>b<div>c</div></p>
+<img src="gx/logo.png" /><img src="timg/tb_xl/inside.jpg" /></div>
+<img src="timg/tb_xl/second.jpg" /></div>
+</body></html>"""
+
+def test_parsePageIgnoresInstalledBackends():
+    # lxml would close the <p>s around the <div>, and saved pages would change.
+    assert str(htmlParser.parsePage(PAGE)) == str(BeautifulSoup(PAGE, "html.parser"))
+
+def test_findImageAcrossChunks(monkeypatch):
+    monkeypatch.setattr(htmlParser, "CHUNK_SIZE", 7)
+    assert htmlParser.findImage(io.StringIO(PAGE), "cm_wide", "timg/tb_xl") == "timg/tb_xl/inside.jpg"
+    assert htmlParser.findImage(io.StringIO(PAGE), "footer", "timg/tb_xl") is None
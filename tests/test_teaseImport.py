@@ -0,0 +1,67 @@
+import os
+import time
+
+from PyQt6 import QtCore
+
+import teaseImport
+from teaseImport import TeaseImporter, transferFile
+
+def makeTease(sourceDir, name: str):
+    os.makedirs(os.path.join(sourceDir, "timg", "tb_xl"))
+    os.makedirs(os.path.join(sourceDir, "tease"))
+    for path in (os.path.join("timg", f"{name}1.jpg"), os.path.join("timg", "tb_xl", f"{name}2.jpg"),
+                 os.path.join("tease", f"{name}3.mp3"), "eosscript.json", "config.ini"):
+        with open(os.path.join(sourceDir, path), "w") as f:
+            f.write(f"{name} {path}")
+
+def waitForImports(importer: TeaseImporter):
+    deadline = time.monotonic() + 10
+    while importer.isRunning():
+        assert time.monotonic() < deadline, "import didn't finish"
+        time.sleep(0.01)
+
+def test_importsBackToBack(tmp_path):
+    importer = TeaseImporter(None)
+    imported = list()
+    importer.teaseImported.connect(lambda *args: imported.append(args), QtCore.Qt.ConnectionType.DirectConnection)
+    teases = list()
+    for name in ("a", "b"):
+        makeTease(sourceDir := tmp_path / "source" / name, name)
+        teases.append((str(sourceDir), str(tmp_path / "teases" / name)))
+
+    try:
+        importer.start(teases[:1])
+        waitForImports(importer)
+        importer.start(teases[1:])
+        waitForImports(importer)
+    finally:
+        importer.shutdown()
+
+    assert imported == [(sourceDir, rootDir, True) for sourceDir, rootDir in teases]
+    for sourceDir, rootDir in teases:
+        for dirPath, _, fileNames in os.walk(sourceDir):
+            for name in fileNames:
+                with open(os.path.join(dirPath, name)) as source, \
+                      open(os.path.join(rootDir, os.path.relpath(dirPath, sourceDir), name)) as dest:
+                    assert source.read() == dest.read()
+    assert (importer.done, importer.total) == (0, 0)
+
+def test_importWithFailedMedia(tmp_path, monkeypatch):
+    def failingTransfer(src, dest, link):
+        if src.endswith("3.mp3"):
+            raise OSError("disk full")
+        return transferFile(src, dest, link)
+    monkeypatch.setattr(teaseImport, "transferFile", failingTransfer)
+    importer = TeaseImporter(None)
+    imported = list()
+    importer.teaseImported.connect(lambda *args: imported.append(args), QtCore.Qt.ConnectionType.DirectConnection)
+    makeTease(sourceDir := tmp_path / "source", "a")
+    rootDir = tmp_path / "teases" / "a"
+    try:
+        importer.start([(str(sourceDir), str(rootDir))])
+        waitForImports(importer)
+    finally:
+        importer.shutdown()
+
+    assert imported == [(str(sourceDir), str(rootDir), False)]
+    assert not rootDir.exists()